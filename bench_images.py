@@ -0,0 +1,98 @@
+# Benchmark of the image frame reception: bytes per second and buffer allocations per image.
+#
+# The frames go through a local socket pair into the real reception loop of server_interaction,
+# including the progressive updates and the image archive (kept in a temporary directory).
+#
+# Usage: python bench_images.py [image count] [width] [height]
+
+import socket           # Local socket pair standing in for the server.
+import sys              # Command-line arguments.
+import tempfile         # Temporary directory for the image archive.
+import threading        # The frames are sent from a separate thread.
+import time             # Measures the reception time.
+import tracemalloc      # Measures the Python memory allocated while receiving.
+
+import numpy as np      # Random pixels for the frames.
+
+import image_archive
+import server_interaction
+
+def _send_frames(sock, frame, count):
+    """
+    Sends the same image frame several times, then closes the socket (which ends the reception loop).
+
+    :param sock: The sending end of the socket pair.
+    :param frame: The complete ISC image frame.
+    :param count: The number of frames to send.
+    """
+    for _ in range(count):
+        sock.sendall(frame)
+    sock.close()
+
+def _receive(frame, count):
+    """
+    Runs the reception loop until 'count' frames were received.
+
+    :return: The reception time in seconds.
+    """
+    receiving, sending = socket.socketpair()
+    server_interaction.connection = receiving
+    sender = threading.Thread(target=_send_frames, args=(sending, frame, count), daemon=True)
+    started = time.perf_counter()
+    sender.start()
+    try:
+        server_interaction.handle_message_reception()
+    except ConnectionError:
+        pass    # The sender closed the socket after the last frame.
+    elapsed = time.perf_counter() - started
+    sender.join()
+    receiving.close()
+    server_interaction.connection = None
+    return elapsed
+
+def run(count=500, width=255, height=255):
+    """
+    Measures the reception of 'count' image frames of the given size and prints the results.
+
+    :param count: The number of frames to receive.
+    :param width: The width of the images (at most 255).
+    :param height: The height of the images (at most 255).
+    """
+    # The archive goes to a temporary directory, removed afterwards; the archive in use is restored.
+    archive_dir = image_archive.ARCHIVE_DIR
+    image_archive.close()
+    with tempfile.TemporaryDirectory(prefix="isc-bench-") as directory:
+        image_archive.ARCHIVE_DIR = directory
+        try:
+            _run(count, width, height)
+        finally:
+            image_archive.close()
+            image_archive.ARCHIVE_DIR = archive_dir
+
+def _run(count, width, height):
+    """
+    Warms up, then measures the throughput, the buffer allocations and the peak Python memory.
+    """
+    pixels = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+    frame = b'ISCi' + bytes([width, height]) + pixels.tobytes()
+
+    # Warm-up: fills the buffer pool and the caches, so that the steady state is measured.
+    _receive(frame, 4)
+
+    pool = server_interaction._image_pool
+    allocations = pool.allocations
+    elapsed = _receive(frame, count)
+    print("Images:              %d of %dx%d (%d bytes each)" % (count, width, height, pixels.nbytes))
+    print("Throughput:          %.1f MB/s, %.0f images/s" % (count * len(frame) / elapsed / 1e6, count / elapsed))
+    print("Buffer allocations:  %.3f per image" % ((pool.allocations - allocations) / count))
+
+    # Second run under tracemalloc (slower): Python memory allocated on top of the pooled buffers.
+    tracemalloc.start()
+    _receive(frame, count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("Peak Python memory:  %.1f kB while receiving (an image is %.1f kB)" % (peak / 1e3, pixels.nbytes / 1e3))
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:4]]
+    run(*arguments)
@@ -0,0 +1,78 @@
+# ==========================================================
+#               IMPORTS AND GLOBAL DEFINITIONS
+# ==========================================================
+
+import threading                    # The pool may be used by several threads (reception, benchmark).
+
+import numpy as np                  # The filled buffers are handed out as NumPy views.
+
+# Smallest size class in bytes; the classes double from there up to the largest one.
+_SMALLEST_CLASS = 4096
+
+# ==========================================================
+#                  SIZE-CLASSED BUFFER POOL
+# ==========================================================
+
+class BufferPool:
+    def __init__(self, largest=256 * 1024, per_class=4):
+        """
+        Constructor for BufferPool, a pool of reusable bytearrays sorted in power-of-two size classes.
+
+        A buffer is taken from the smallest class that holds the requested size and given back
+        once its content was used, so that receiving frames of similar sizes allocates nothing
+        after the first few. Requests bigger than the largest class get a buffer of their own
+        that is not kept.
+
+        :param largest: The size of the largest class in bytes (a full 255x255 image needs 195075 bytes).
+        :param per_class: The number of free buffers kept in each class.
+        """
+        self.classes = []
+        size = _SMALLEST_CLASS
+        while size < largest:
+            self.classes.append(size)
+            size *= 2
+        self.classes.append(size)
+        self.per_class = per_class
+        self.free = {size: [] for size in self.classes}
+        self.lock = threading.Lock()
+        self.allocations = 0        # Buffers allocated so far (the misses of the pool).
+
+    def _class_of(self, size):
+        for size_class in self.classes:
+            if size <= size_class:
+                return size_class
+        return None
+
+    def acquire(self, size):
+        """
+        :param size: The number of bytes needed.
+        :return: A bytearray of at least 'size' bytes (its content is undefined).
+        """
+        size_class = self._class_of(size)
+        with self.lock:
+            if size_class is not None and self.free[size_class]:
+                return self.free[size_class].pop()
+            self.allocations += 1
+        return bytearray(size_class if size_class is not None else size)
+
+    def release(self, buffer):
+        """
+        Gives a buffer back to the pool; it must not be used (nor any view of it) afterwards.
+
+        :param buffer: A bytearray returned by acquire().
+        """
+        with self.lock:
+            free = self.free.get(len(buffer))
+            if free is not None and len(free) < self.per_class:
+                free.append(buffer)
+
+def as_image(buffer, width, height):
+    """
+    Views the start of a buffer as an RGB image, without copying it.
+
+    :param buffer: A bytearray of at least width * height * 3 bytes.
+    :param width: The width of the image.
+    :param height: The height of the image.
+    :return: A (height x width x 3) uint8 NumPy array sharing the memory of the buffer.
+    """
+    return np.frombuffer(buffer, dtype=np.uint8, count=width * height * 3).reshape((height, width, 3))
@@ -4,8 +4,19 @@ from PyQt6.QtCore import pyqtSignal, QObject
 # which means it will be able to use Qt's signal and slot mechanism.
 class Communicator(QObject):
     chat_msg = pyqtSignal(str, str)
+
+    # Emitted with each part of a long message, delivered as it arrives:
+    # sender, message id, text of the part, and whether it is the last part.
+    chat_msg_part = pyqtSignal(str, str, str, bool)
     
     chat_img = pyqtSignal(int)
 
+    # Emitted with the rows of an image being received, as they arrive:
+    # image counter, width, height, index of the first row, and the RGB bytes of the rows.
+    chat_img_rows = pyqtSignal(int, int, int, int, bytes)
+
+    # Emitted with the new connection state (see server_interaction.connection_state).
+    connection_state = pyqtSignal(int)
+
 # Create an instance of the Communicator class.
 comm = Communicator()
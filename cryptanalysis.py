@@ -0,0 +1,222 @@
+# -------------------------------------------------------------------
+# IMPORTS
+# -------------------------------------------------------------------
+import numpy as np                           # Vectorized frequency counting and chi-squared scoring.
+
+# -------------------------------------------------------------------
+# GLOBAL DEFINITIONS
+# -------------------------------------------------------------------
+# Size of the plaintext alphabet the scorer knows about (code points 0..255).
+_TABLE_SIZE = 256
+
+# Range of key characters tried for each Vigenère column (printable ASCII, no space).
+_KEY_MIN = 33
+_KEY_MAX = 126
+
+# Fewest symbols per column when estimating a Vigenère key length (shorter columns are too noisy).
+_MIN_COLUMN = 8
+
+# Relative frequencies (in percent) of the letters in English text.
+_ENGLISH = {
+    "a": 8.167, "b": 1.492, "c": 2.782, "d": 4.253, "e": 12.702, "f": 2.228,
+    "g": 2.015, "h": 6.094, "i": 6.966, "j": 0.153, "k": 0.772, "l": 4.025,
+    "m": 2.406, "n": 6.749, "o": 7.507, "p": 1.929, "q": 0.095, "r": 5.987,
+    "s": 6.327, "t": 9.056, "u": 2.758, "v": 0.978, "w": 2.360, "x": 0.150,
+    "y": 1.974, "z": 0.074,
+}
+
+def _build_expected():
+    """
+    Build the expected probability of every code point in a plaintext message.
+
+    Lowercase letters carry most of the weight, followed by the space, the uppercase
+    letters and the remaining printable characters. Line breaks and tabs get realistic
+    weights so that multi-line text is scored like any other text. The other control
+    characters get a small (but not negligible) probability, so that one of them can't
+    outweigh the whole letter distribution in the chi-squared statistic.
+
+    :return: A NumPy array of length _TABLE_SIZE summing to 1.
+    """
+    table = np.full(_TABLE_SIZE, 1e-5)
+    table[32:127] = 1e-3                     # Any printable ASCII character (digits, punctuation...).
+    table[ord("\n")] = 0.015                 # About one line break every 60-70 characters.
+    table[ord("\r")] = 0.003                 # Windows line endings.
+    table[ord("\t")] = 0.002                 # Indentation.
+    table[160:256] = 1e-4                    # Latin-1 letters (accents), rare but plausible.
+    for letter, frequency in _ENGLISH.items():
+        table[ord(letter)] = frequency / 100 * 0.72
+        table[ord(letter.upper())] = frequency / 100 * 0.06
+    table[ord(" ")] = 0.17
+    return table / table.sum()
+
+# Expected plaintext distribution, computed once at import time.
+_EXPECTED = _build_expected()
+
+# Probability used for plaintext candidates falling outside of the table.
+_OUT_OF_TABLE = 1e-6
+
+# -------------------------------------------------------------------
+# FUNCTION: _to_codes
+# -------------------------------------------------------------------
+def _to_codes(message):
+    """
+    Convert a message into the code points stored in the 4-byte slots of the ISC frames.
+
+    UTF-32 big-endian is exactly one 4-byte code point per character, so the whole
+    message is converted with a single encode call and no Python-level loop.
+
+    :param message: The string message to convert.
+    :return: A NumPy int64 array with one value per character.
+    """
+    return np.frombuffer(message.encode("utf-32-be"), dtype=">u4").astype(np.int64)
+
+# -------------------------------------------------------------------
+# FUNCTION: _from_codes
+# -------------------------------------------------------------------
+def _from_codes(codes):
+    """
+    Convert integer values back into the 4-byte representation used by the ISC frames.
+
+    :param codes: A NumPy integer array with one value per character.
+    :return: A bytearray where each character is stored in 4 bytes (big-endian).
+    """
+    return bytearray(np.clip(codes, 0, None).astype(">u4").tobytes())
+
+# -------------------------------------------------------------------
+# FUNCTION: _score_shifts
+# -------------------------------------------------------------------
+def _score_shifts(codes, candidates):
+    """
+    Compute the chi-squared statistic of every candidate shift at once.
+
+    With O the observed and E the expected counts, chi2 = sum(O^2 / E) - N, so only the
+    distinct ciphertext symbols need to be looked at: a (candidates x symbols) matrix.
+
+    :param codes: A NumPy int64 array with the ciphertext values.
+    :param candidates: A NumPy int64 array with the shift keys to try.
+    :return: A NumPy float array with the chi-squared score of each candidate (lower is better).
+    """
+    symbols, counts = np.unique(codes, return_counts=True)
+    total = codes.size
+
+    # Plaintext value of every distinct symbol for every candidate key.
+    plain = symbols[None, :] - candidates[:, None]
+    inside = (plain >= 0) & (plain < _TABLE_SIZE)
+    expected = np.where(inside, _EXPECTED[np.clip(plain, 0, _TABLE_SIZE - 1)], _OUT_OF_TABLE) * total
+
+    return (counts[None, :] ** 2 / expected).sum(axis=1) - total
+
+# -------------------------------------------------------------------
+# FUNCTION: _best_shift
+# -------------------------------------------------------------------
+def _best_shift(codes, low=None, high=None):
+    """
+    Find the shift key giving the most English-looking plaintext.
+
+    Only the keys mapping every symbol into the known table are tried when possible;
+    otherwise a full table-wide window below the smallest symbol is used.
+
+    :param codes: A NumPy int64 array with the ciphertext values.
+    :param low: (Optional) Smallest key allowed.
+    :param high: (Optional) Largest key allowed.
+    :return: The best shift key as an integer.
+    """
+    smallest, biggest = int(codes.min()), int(codes.max())
+    start, stop = biggest - (_TABLE_SIZE - 1), smallest
+    if start > stop:
+        start = smallest - (_TABLE_SIZE - 1)
+    if low is not None and high is not None and max(start, low) <= min(stop, high):
+        start, stop = max(start, low), min(stop, high)
+
+    candidates = np.arange(start, stop + 1, dtype=np.int64)
+    return int(candidates[np.argmin(_score_shifts(codes, candidates))])
+
+# -------------------------------------------------------------------
+# FUNCTION: crack_shift
+# -------------------------------------------------------------------
+def crack_shift(message):
+    """
+    Recover the key of a shift cipher by trying every plausible shift at once.
+
+    :param message: The encoded string message.
+    :return: A tuple (key, decoded) where decoded is a bytearray with each character in 4 bytes.
+    """
+    codes = _to_codes(message)
+    if codes.size == 0:
+        return 0, bytearray()
+    key = _best_shift(codes)
+    return key, _from_codes(codes - key)
+
+# -------------------------------------------------------------------
+# FUNCTION: index_of_coincidence
+# -------------------------------------------------------------------
+def index_of_coincidence(codes, key_length):
+    """
+    Compute the mean index of coincidence of the columns obtained for a given key length.
+
+    The shifts are additive, so a column encoded with a single key character keeps the
+    index of coincidence of the plaintext while mixed columns flatten it.
+
+    :param codes: A NumPy int64 array with the ciphertext values.
+    :param key_length: The number of columns to split the message into.
+    :return: The mean index of coincidence as a float (0 when no column is long enough).
+    """
+    offset = codes - codes.min()
+    span = int(offset.max()) + 1
+    # Count every (column, symbol) pair with a single bincount call.
+    columns = np.arange(codes.size) % key_length
+    counts = np.bincount(columns * span + offset, minlength=key_length * span).reshape(key_length, span)
+
+    sizes = counts.sum(axis=1)
+    valid = sizes > 1
+    if not valid.any():
+        return 0.0
+    coincidences = (counts * (counts - 1)).sum(axis=1)
+    return float((coincidences[valid] / (sizes[valid] * (sizes[valid] - 1))).mean())
+
+# -------------------------------------------------------------------
+# FUNCTION: estimate_key_length
+# -------------------------------------------------------------------
+def estimate_key_length(codes, max_length=20):
+    """
+    Estimate the length of a Vigenère key using the index of coincidence.
+
+    Multiples of the real length score as well as the length itself, so the smallest
+    length reaching 80% of the best score is chosen. Columns of only a few symbols give
+    spuriously high indexes, so every column must hold at least _MIN_COLUMN symbols.
+
+    :param codes: A NumPy int64 array with the ciphertext values.
+    :param max_length: The longest key length to try.
+    :return: The estimated key length as an integer.
+    """
+    max_length = max(1, min(max_length, codes.size // _MIN_COLUMN))
+    scores = np.array([index_of_coincidence(codes, length) for length in range(1, max_length + 1)])
+    return int(np.argmax(scores >= scores.max() * 0.8)) + 1
+
+# -------------------------------------------------------------------
+# FUNCTION: crack_vigenere
+# -------------------------------------------------------------------
+def crack_vigenere(message, max_length=20):
+    """
+    Recover the key of a Vigenère cipher: estimate its length, then solve each column as a shift cipher.
+
+    :param message: The encoded string message.
+    :param max_length: The longest key length to try.
+    :return: A tuple (key, decoded) where key is a string and decoded a bytearray with each character in 4 bytes.
+    """
+    codes = _to_codes(message)
+    if codes.size == 0:
+        return "", bytearray()
+
+    key_length = estimate_key_length(codes, max_length)
+    shifts = np.array([_best_shift(codes[i::key_length], _KEY_MIN, _KEY_MAX) for i in range(key_length)], dtype=np.int64)
+
+    # A multiple of the real length gives the key repeated: keep its shortest period.
+    for period in range(1, key_length):
+        if key_length % period == 0 and np.array_equal(shifts, np.resize(shifts[:period], key_length)):
+            shifts = shifts[:period]
+            break
+
+    # Repeat the recovered key over the whole message to decode it in one operation.
+    decoded = codes - np.resize(shifts, codes.size)
+    return "".join(chr(s) for s in shifts.clip(0)), _from_codes(decoded)
@@ -3,11 +3,16 @@
 # -------------------------------------------------------------------
 from hashlib import sha256                   # For computing SHA-256 hashes.
 import random                                # For generating random numbers (used in various crypto functions).
+from functools import lru_cache              # For caching the small-prime sieve used by the primality test.
+from math import gcd                         # For checking that the RSA public exponent is invertible.
 from cryptography.hazmat.primitives.asymmetric import dh    # For Diffie-Hellman key exchange primitives.
 from sympy import primerange, primitive_root   # For generating a range of prime numbers and finding primitive roots.
 
 from communicator import comm                # Custom communication module; used to emit signals to update the UI.
 
+import cryptanalysis                         # Vectorized cipher breaking (shift and Vigenère key recovery).
+import recorder                              # Flight recorder; the task state transitions are traced.
+
 import window                                # Custom module to interact with the GUI (details within the module).
 import server_interaction                    # Custom module to interact with the server for sending messages.
 
@@ -34,17 +39,51 @@ dh_space = [0, 0, 0]
 # List to store messages received from the server.
 server_msg = list[str]()   # Using type hinting to indicate a list of strings.
 
+# Raw bytes (4 bytes per character) of the last server message; needed by RSA decoding
+# because ciphertext blocks are rarely valid UTF-8 once the padding is stripped.
+last_server_raw = bytes()
+
+# Local RSA key pair, filled by generate_rsa_key():
+# n, e, d, the primes p and q, and the CRT values dP, dQ and qInv.
+rsa_key = dict[str, int]()
+
+# Public exponent used for generated RSA keys.
+RSA_PUBLIC_EXPONENT = 65537
+
+# -------------------------------------------------------------------
+# FUNCTION: task_state
+# -------------------------------------------------------------------
+def task_state():
+    """
+    Describe the active crypto task from the flags, for the flight recorder.
+
+    :return: A short string such as "shift encode", "DifHel step 2" or "idle".
+    """
+    task = ("shift" if isShifting else "vigenere" if isVigenering else "RSA" if isRSAing
+            else "hash" if isHashing else "DifHel step " + str(difHelStep) if isDifHeling else "")
+    if not task:
+        return "idle"
+    if isHashing:
+        return task + (" verify" if isVerifying else " hash")
+    if isDifHeling:
+        return task
+    return task + (" encode" if isEncoding else " decode")
+
 # -------------------------------------------------------------------
 # FUNCTION: appendServerMsg
 # -------------------------------------------------------------------
-def appendServerMsg(msg: str):
+def appendServerMsg(msg: str, raw: bytes = b""):
     """
     Append the server message to the message list and execute the linked crypto tasks when enough messages are received.
 
     :param msg: The decoded message received from the server.
+    :param raw: (Optional) The raw message bytes, each character stored in 4 bytes.
     """
     global isShifting, isVigenering, isRSAing, isHashing, isDifHeling
-    global isEncoding, isVerifying, difHelStep
+    global isEncoding, isVerifying, difHelStep, last_server_raw
+
+    last_server_raw = bytes(raw)
+    state_before = task_state()
 
     # Append the received message to the global server_msg list.
     server_msg.append(msg)
@@ -82,13 +121,21 @@ def appendServerMsg(msg: str):
     # Handling RSA Encryption
     # Here also two messages are expected: one with RSA parameters and one with the plain message.
     # The RSA parameters are extracted from the first message.
+    # For decoding, our public key is sent after the first message and the second
+    # message holds the ciphertext, decrypted from its raw 4-byte blocks.
     # -------------------------------------------------------------------
+    if isRSAing == True and isEncoding == False and len(server_msg) == 1:
+        generate_rsa_key()
+        server_interaction.send_message("s", str(rsa_key["n"]) + "," + str(rsa_key["e"]))
+
     if isRSAing == True and len(server_msg) == 2:
         if isEncoding:
             # Expecting RSA parameters in the form "... n=<n_value>, e=<e_value>"
             n_value = server_msg[0].split(", e=")[0].split("n=")[-1]
             e_value = server_msg[0].split(", e=")[-1]
             server_interaction.send_message("s", encode_rsa(server_msg[1], n_value, e_value))
+        else:
+            server_interaction.send_message("s", decode_rsa(last_server_raw))
         isRSAing = False
         isEncoding = False
         server_msg.clear()
@@ -136,6 +183,10 @@ def appendServerMsg(msg: str):
         difHelStep = 0
         server_msg.clear()
 
+    state_after = task_state()
+    if state_after != state_before:
+        recorder.record("task", state_before, "->", state_after)
+
 # -------------------------------------------------------------------
 # FUNCTION: encode_shift
 # -------------------------------------------------------------------
@@ -215,6 +266,160 @@ def encode_rsa(message, key_n, key_e):
         result.extend(int.to_bytes(encrypted, 4))
     return result
 
+# -------------------------------------------------------------------
+# FUNCTION: _small_primes
+# -------------------------------------------------------------------
+@lru_cache(maxsize=None)
+def _small_primes(limit=2000):
+    """
+    Compute the primes below the limit with a sieve of Eratosthenes (cached after the first call).
+
+    :param limit: The exclusive upper bound of the sieve.
+    :return: A tuple with the primes below the limit.
+    """
+    sieve = bytearray([1]) * limit
+    sieve[0:2] = b"\x00\x00"
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            # Mark every multiple of i starting at i*i as composite in one slice assignment.
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return tuple(i for i in range(limit) if sieve[i])
+
+# -------------------------------------------------------------------
+# FUNCTION: is_probable_prime
+# -------------------------------------------------------------------
+def is_probable_prime(n, rounds=16):
+    """
+    Test the primality of n: trial division by the small primes, then Miller-Rabin.
+
+    The first twelve primes as bases make the test deterministic below 3.3 * 10^24;
+    random bases are added for larger numbers.
+
+    :param n: The integer to test.
+    :param rounds: The number of random bases used for large numbers.
+    :return: True if n is (very probably) prime, False otherwise.
+    """
+    if n < 2:
+        return False
+    for p in _small_primes():
+        if n % p == 0:
+            return n == p
+
+    # Write n - 1 as d * 2^r with d odd.
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+
+    bases = list(_small_primes()[:12])
+    if n >= 3317044064679887385961981:
+        bases += [random.randrange(2, n - 1) for _ in range(rounds)]
+
+    for a in bases:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+# -------------------------------------------------------------------
+# FUNCTION: _random_prime
+# -------------------------------------------------------------------
+def _random_prime(bits):
+    """
+    Draw a random prime of exactly the given number of bits.
+
+    The two highest bits are set so that the product of two such primes has exactly twice as many bits.
+
+    :param bits: The size of the prime in bits.
+    :return: The prime as an integer.
+    """
+    while True:
+        candidate = random.getrandbits(bits) | (0b11 << (bits - 2)) | 1
+        if is_probable_prime(candidate):
+            return candidate
+
+# -------------------------------------------------------------------
+# FUNCTION: generate_rsa_key
+# -------------------------------------------------------------------
+def generate_rsa_key(bits=32):
+    """
+    Generate a local RSA key pair and store it in rsa_key, with the CRT values used for decryption.
+
+    The default of 32 bits keeps every ciphertext block inside the 4 bytes used per character.
+
+    :param bits: The size of the modulus n in bits.
+    :return: The generated key as a dictionary.
+    """
+    global rsa_key
+    e = RSA_PUBLIC_EXPONENT
+    while True:
+        p = _random_prime(bits // 2)
+        q = _random_prime(bits - bits // 2)
+        if p != q and gcd(e, (p - 1) * (q - 1)) == 1:
+            break
+
+    d = pow(e, -1, (p - 1) * (q - 1))
+    rsa_key = {
+        "n": p * q, "e": e, "d": d, "p": p, "q": q,
+        "dP": d % (p - 1),              # Private exponent reduced modulo p - 1.
+        "dQ": d % (q - 1),              # Private exponent reduced modulo q - 1.
+        "qInv": pow(q, -1, p),          # Inverse of q modulo p, used to recombine both halves.
+    }
+    return rsa_key
+
+# -------------------------------------------------------------------
+# FUNCTION: _decrypt_block
+# -------------------------------------------------------------------
+def _decrypt_block(c, key):
+    """
+    Decrypt a single RSA block with the Chinese Remainder Theorem.
+
+    Two exponentiations with half-size moduli and exponents replace pow(c, d, n),
+    which is roughly 3-4 times faster.
+
+    :param c: The ciphertext block as an integer.
+    :param key: The RSA key dictionary (see generate_rsa_key).
+    :return: The plaintext block as an integer.
+    """
+    m1 = pow(c, key["dP"], key["p"])
+    m2 = pow(c, key["dQ"], key["q"])
+    h = (key["qInv"] * (m1 - m2)) % key["p"]
+    return m2 + h * key["q"]
+
+# -------------------------------------------------------------------
+# FUNCTION: decode_rsa
+# -------------------------------------------------------------------
+def decode_rsa(message, key=None):
+    """
+    Decode a message encrypted character by character with our public key.
+
+    Each character is a 4-byte block. Identical characters give identical blocks, so
+    every distinct block is decrypted only once and the results are reused.
+
+    :param message: The raw ciphertext bytes (4 bytes per character), or a list of block integers.
+    :param key: (Optional) The RSA key dictionary; defaults to the generated rsa_key.
+    :return: A bytearray containing the decoded message, where each character is stored in 4 bytes.
+    """
+    key = key or rsa_key
+    if isinstance(message, (bytes, bytearray)):
+        blocks = [int.from_bytes(message[i:i + 4]) for i in range(0, len(message) - len(message) % 4, 4)]
+    else:
+        blocks = list(message)
+
+    # Decrypt each distinct block once.
+    plain = {c: _decrypt_block(c, key) for c in set(blocks)}
+
+    result = bytearray()
+    for c in blocks:
+        result.extend(int.to_bytes(plain[c], 4))
+    return result
+
 # -------------------------------------------------------------------
 # FUNCTION: hash_hash
 # -------------------------------------------------------------------
@@ -293,9 +498,17 @@ def crypto(command: list[str]):
       - The operation (e.g., "encode", "decode", "verify")
       - The message and associated keys.
 
+    For RSA, "RSA generate" creates a local key pair and "RSA decode" decrypts
+    ciphertext blocks given as integers with that key.
+
+    The "crack" command reverses the order: "crack <shift|vigenere> <message>" recovers
+    the key of an encoded message without knowing it and decodes the message.
+
     :param command: List of string tokens from the command (without the initial identifier).
     """
     result = bytearray()
+    # Key found by the "crack" command, shown along with the decoded message.
+    key = None
     # Determine if we are encoding or verifying based on the command.
     isEncode = command[1] == "encode"
     isVerifying = command[1] == "verify"
@@ -314,13 +527,28 @@ def crypto(command: list[str]):
                 result = encode_vigenere(" ".join(command[2:-1]), command[-1])
         case "RSA":
             if isEncode:
-                # For RSA, expects the key as the last token; the message is the concatenation of tokens in between.
-                result = encode_rsa(" ".join(command[2:-1]), command[-1])
+                # For RSA, expects the key as the last token ("n,e"); the message is the concatenation of tokens in between.
+                # Without a comma, the exponent of the local key is used.
+                key_n, _, key_e = command[-1].partition(",")
+                result = encode_rsa(" ".join(command[2:-1]), key_n, key_e or rsa_key.get("e", RSA_PUBLIC_EXPONENT))
+            elif command[1] == "generate":
+                # Generate a local key pair and show its public part.
+                generate_rsa_key()
+                result = bytearray(("n=" + str(rsa_key["n"]) + ", e=" + str(rsa_key["e"])).encode())
+            elif rsa_key:
+                # For RSA decoding, the ciphertext blocks are given as integers separated by spaces.
+                result = decode_rsa([int(c) for c in command[2:] if c.isdigit()])
         case "hash":
             if isVerifying:
                 result = hash_verify(" ".join(command[2:-1]), command[-1])
             else:
                 result = hash_hash(" ".join(command[2::]))
+        case "crack":
+            # For cracking, the whole remainder of the command is the encoded message.
+            if command[1] == "shift":
+                key, result = cryptanalysis.crack_shift(" ".join(command[2:]))
+            elif command[1] == "vigenere":
+                key, result = cryptanalysis.crack_vigenere(" ".join(command[2:]))
 
     # Emit the original crypto command to the UI.
     comm.chat_msg.emit("<Crypto>", " ".join(command))
@@ -331,3 +559,6 @@ def crypto(command: list[str]):
 
     # Emit the resulting text back to the UI.
     comm.chat_msg.emit("<Crypto>", text)
+
+    if key is not None:
+        comm.chat_msg.emit("<Crypto>", "Recovered key: " + str(key))
@@ -0,0 +1,198 @@
+# -------------------------------------------------------------------
+# IMPORTS
+# -------------------------------------------------------------------
+import base64                                # For packing the sealed messages into chat text.
+from hashlib import sha256                   # For the short fingerprint of the session key.
+from cryptography.hazmat.primitives import hashes                          # SHA-256 for HKDF.
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey  # Diffie-Hellman over Curve25519.
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM             # Authenticated encryption of the messages.
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF                   # Derives the session key from the shared secret.
+from cryptography.exceptions import InvalidTag                             # Raised when a message fails authentication.
+
+# -------------------------------------------------------------------
+# GLOBAL DEFINITIONS
+# -------------------------------------------------------------------
+# Prefixes marking the end-to-end messages inside the chat ('t') frames.
+# An offer is "E2E-DH:<public key of the sender>"; the answer to an offer is
+# "E2E-DH:<public key of the sender>:<public key of the offer it answers>" (hexadecimal X25519 keys).
+HANDSHAKE_PREFIX = "E2E-DH:"
+SEALED_PREFIX = "E2E:"           # Followed by base64(nonce || ciphertext || tag).
+
+# State of the end-to-end session:
+_private_key = None      # Our ephemeral DH private key, only kept while a handshake we sent is pending.
+_public_hex = ""         # Our DH public key, as sent in the last handshake.
+_used_peer_keys = set()  # Peer public keys already used in an exchange; replaying one is ignored.
+_offer = ""              # Public key of the last offer seen but not answered (for '/e2e accept').
+_accepting = False       # Set by '/e2e accept': the local user opted in to answer an offer.
+_aead = None             # AESGCM instance built once from the session key (None while inactive).
+_fingerprint = ""        # Short hash of the session key, to compare with the peer.
+_nonce_prefix = b""      # 4 bytes derived from our public key; the 8 other nonce bytes are a counter.
+_counter = 0             # Number of messages sealed with the current session key.
+
+# -------------------------------------------------------------------
+# FUNCTION: is_active
+# -------------------------------------------------------------------
+def is_active():
+    """
+    :return: True if a session key is established and chat messages are sealed.
+    """
+    return _aead is not None
+
+# -------------------------------------------------------------------
+# FUNCTION: fingerprint
+# -------------------------------------------------------------------
+def fingerprint():
+    """
+    :return: A short fingerprint of the session key (identical on both peers).
+    """
+    return _fingerprint
+
+# -------------------------------------------------------------------
+# FUNCTION: start
+# -------------------------------------------------------------------
+def start():
+    """
+    Start a new handshake: draw a fresh X25519 key pair and build the offer announcing its public key.
+
+    Until a peer answers, the handshake is pending and the first answer addressed to it sets up the session.
+
+    :return: The handshake text to send in a chat message.
+    """
+    global _private_key, _public_hex
+    _private_key = X25519PrivateKey.generate()
+    _public_hex = _private_key.public_key().public_bytes_raw().hex()
+    return HANDSHAKE_PREFIX + _public_hex
+
+# -------------------------------------------------------------------
+# FUNCTION: stop
+# -------------------------------------------------------------------
+def stop():
+    """
+    Forget the session key and the handshake state; chat messages are sent in plaintext again.
+    """
+    global _private_key, _public_hex, _aead, _fingerprint, _offer, _accepting
+    _private_key = None
+    _public_hex = ""
+    _aead = None
+    _fingerprint = ""
+    _offer = ""
+    _accepting = False
+
+# -------------------------------------------------------------------
+# FUNCTION: accept
+# -------------------------------------------------------------------
+def accept():
+    """
+    Opt in to an end-to-end session offered by a peer ('/e2e accept').
+
+    The last offer seen is answered right away; without one, the next offer will be.
+
+    :return: A tuple (handshake text to send back or None, status) as returned by handle_handshake.
+    """
+    global _accepting
+    _accepting = True
+    if _offer:
+        return handle_handshake(HANDSHAKE_PREFIX + _offer)
+    return None, None
+
+# -------------------------------------------------------------------
+# FUNCTION: handle_handshake
+# -------------------------------------------------------------------
+def handle_handshake(text):
+    """
+    Handle a handshake message received in the chat and derive the session key.
+
+    A handshake sets up a session in two cases only:
+      - It answers the offer we sent (addressed to our public key) while it is still pending.
+      - It is an offer and the local user opted in with '/e2e accept': we answer with a fresh key of our own.
+    An offer seen without opting in is only remembered, so that clients never join a session
+    on their own. Other handshakes (answers to someone else, an established session) are
+    ignored, and so is any peer key seen before. Every exchange uses a fresh private key of
+    ours that is dropped right after, so a session key is never derived twice and its nonce
+    counter never starts over under the same key.
+
+    :param text: The received handshake text (starting with HANDSHAKE_PREFIX).
+    :return: A tuple (handshake text to send back or None, status) where status is
+             "established" for a new session, "offered" for an offer waiting for '/e2e accept', or None.
+    """
+    global _private_key, _aead, _fingerprint, _nonce_prefix, _counter, _offer, _accepting
+    peer_hex, _, target = text[len(HANDSHAKE_PREFIX):].strip().partition(":")
+    if peer_hex == _public_hex or peer_hex in _used_peer_keys:
+        return None, None    # Echo of our own handshake, or replay of an earlier one.
+
+    try:
+        peer_key = X25519PublicKey.from_public_bytes(bytes.fromhex(peer_hex))
+    except ValueError:
+        return None, None    # Malformed handshake.
+
+    reply = None
+    if target:
+        # An answer: it only completes our own pending offer.
+        if _private_key is None or target != _public_hex:
+            if target == _offer:
+                _offer = ""    # Someone else took the offer we were shown.
+            return None, None
+    else:
+        # An offer: only answered when the local user opted in.
+        if _aead is not None or _private_key is not None:
+            return None, None    # Session established or own offer pending; '/e2e stop' first.
+        if not _accepting:
+            _offer = peer_hex
+            return None, "offered"
+        reply = start() + ":" + peer_hex
+
+    _used_peer_keys.add(peer_hex)
+    shared = _private_key.exchange(peer_key)
+    # The exchange is done: drop the private key so that nothing else can complete it again.
+    _private_key = None
+
+    # Both public keys, in a fixed order, bind the key to this exchange.
+    info = b"ISC end-to-end " + "|".join(sorted([_public_hex, peer_hex])).encode()
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(shared)
+
+    # The AEAD context is built once per session and reused for every message.
+    _aead = AESGCM(key)
+    _fingerprint = sha256(key).hexdigest()[:8]
+    # Each peer gets its own nonce prefix, so both directions never share a nonce.
+    _nonce_prefix = sha256(_public_hex.encode()).digest()[:4]
+    _counter = 0
+    _offer = ""
+    _accepting = False
+    return reply, "established"
+
+# -------------------------------------------------------------------
+# FUNCTION: seal
+# -------------------------------------------------------------------
+def seal(message):
+    """
+    Encrypt and authenticate a whole chat message with the session key.
+
+    The nonce is our per-session prefix followed by a message counter, so no random
+    bytes are drawn per message and a nonce is never reused with the same key.
+
+    :param message: The plaintext string message.
+    :return: The sealed message, as text ready to be sent in a chat frame.
+    """
+    global _counter
+    nonce = _nonce_prefix + _counter.to_bytes(8, "big")
+    _counter += 1
+    sealed = nonce + _aead.encrypt(nonce, message.encode("utf-8"), None)
+    return SEALED_PREFIX + base64.b64encode(sealed).decode("ascii")
+
+# -------------------------------------------------------------------
+# FUNCTION: open_sealed
+# -------------------------------------------------------------------
+def open_sealed(text):
+    """
+    Decrypt and verify a sealed chat message.
+
+    :param text: The received text (starting with SEALED_PREFIX).
+    :return: The plaintext string, or None if there is no session key or the message is not authentic.
+    """
+    if _aead is None:
+        return None
+    try:
+        sealed = base64.b64decode(text[len(SEALED_PREFIX):])
+        return _aead.decrypt(sealed[:12], sealed[12:], None).decode("utf-8", errors="replace")
+    except (ValueError, InvalidTag):
+        return None
@@ -0,0 +1,317 @@
+# ==========================================================
+#               IMPORTS AND GLOBAL DEFINITIONS
+# ==========================================================
+
+import mmap                         # Zero-copy reads of the archived pixels.
+import os                           # Paths, file sizes and atomic replacement of the index.
+import struct                       # Fixed-size entries of the index file.
+import threading                    # The reception thread stores while the UI thread reads.
+
+import numpy as np                  # The images are handled as (height x width x 3) uint8 arrays.
+from PIL import Image               # Only used to export an archived image to a regular image file.
+
+# Directory holding the segments and the index.
+ARCHIVE_DIR = "imgs"
+
+# A segment is closed and a new one started once it would grow over this size.
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+# Number of images kept; older ones are deleted and their space reclaimed by compaction.
+MAX_IMAGES = 1000
+
+# The index starts with a header (first free image id when it was written) followed by one
+# entry per stored or deleted image: image id, segment number, offset, width, height.
+_HEADER = struct.Struct("<Q")
+_ENTRY = struct.Struct("<QIQHH")
+_DELETED = 0xFFFFFFFF               # Segment number of the entries marking a deleted image.
+_INDEX_NAME = "archive.idx"
+
+# State of the archive (loaded lazily from the index file):
+_lock = threading.RLock()
+_index = dict()          # Image id -> (segment, offset, width, height), oldest first.
+_index_pos = 0           # Bytes of the index file already loaded.
+_index_inode = None      # Inode of the loaded index; compaction replaces the file with a new one.
+_index_file = None       # Index file opened for appending (writer only).
+_next_id = 0             # Id of the next stored image; ids are never reused, even across launches.
+_segment = 0             # Number of the segment receiving new images.
+_segment_file = None     # That segment, opened for appending (writer only).
+_maps = dict()           # Segment number -> read-only mmap of the segment.
+_dead_bytes = None       # Bytes of deleted images still in the segments (None until computed).
+
+# ==========================================================
+#                      INDEX HANDLING
+# ==========================================================
+
+def _path(name):
+    return os.path.join(ARCHIVE_DIR, name)
+
+def _segment_name(segment):
+    return "segment-%06d.raw" % segment
+
+def _load():
+    """
+    Reads the index entries appended since the last call.
+
+    Another process may be writing the archive (multi-process mode), so the index is read
+    incrementally and reloaded from the start when compaction replaced it.
+    """
+    global _index_pos, _index_inode, _next_id, _segment, _dead_bytes
+    path = _path(_INDEX_NAME)
+    if not os.path.exists(path):
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(0))
+
+    with open(path, "rb") as file:
+        inode = os.fstat(file.fileno()).st_ino
+        if inode != _index_inode:
+            # New or compacted index: start over.
+            _index.clear()
+            _maps.clear()
+            _index_inode = inode
+            _index_pos = _HEADER.size
+            _next_id = _HEADER.unpack(file.read(_HEADER.size))[0]
+            _dead_bytes = None
+        file.seek(_index_pos)
+        data = file.read()
+
+    # A partially written entry (e.g. after a crash) is ignored until it is complete.
+    usable = len(data) - len(data) % _ENTRY.size
+    for image_id, segment, offset, width, height in _ENTRY.iter_unpack(data[:usable]):
+        if segment == _DELETED:
+            _index.pop(image_id, None)
+        else:
+            _index[image_id] = (segment, offset, width, height)
+            _segment = max(_segment, segment)
+        _next_id = max(_next_id, image_id + 1)
+    _index_pos += usable
+
+    if _dead_bytes is None:
+        live = sum(width * height * 3 for _, _, width, height in _index.values())
+        stored = sum(os.path.getsize(_path(name)) for name in os.listdir(ARCHIVE_DIR) if name.startswith("segment-"))
+        _dead_bytes = stored - live
+
+def _append_entry(*entry):
+    global _index_file, _index_pos
+    if _index_file is None:
+        _index_file = open(_path(_INDEX_NAME), "ab")
+    _index_file.write(_ENTRY.pack(*entry))
+    _index_file.flush()
+    _index_pos += _ENTRY.size
+
+# ==========================================================
+#                     STORING AND READING
+# ==========================================================
+
+def next_id():
+    """
+    :return: The id the next stored image will get (known before its pixels are received).
+    """
+    with _lock:
+        _load()
+        return _next_id
+
+def store(array):
+    """
+    Appends an image to the current segment: one sequential write of the raw pixels and one index entry.
+
+    :param array: The image as a (height x width x 3) uint8 NumPy array.
+    :return: The id of the stored image.
+    :raises OSError: If the archive couldn't be written.
+    """
+    global _next_id, _segment, _segment_file
+    height, width = array.shape[:2]
+    with _lock:
+        _load()
+        if _segment_file is None:
+            _segment_file = open(_path(_segment_name(_segment)), "ab")
+        offset = _segment_file.tell()
+        if offset > 0 and offset + array.nbytes > SEGMENT_SIZE:
+            # Rotation: the current segment is full, start the next one.
+            _segment_file.close()
+            _segment += 1
+            _segment_file = open(_path(_segment_name(_segment)), "ab")
+            offset = 0
+            if _dead_bytes > SEGMENT_SIZE:
+                compact()
+                return store(array)
+        if array.nbytes > 0:
+            # (An image with a zero side has no pixels to write, only its index entry.)
+            _segment_file.write(memoryview(np.ascontiguousarray(array)).cast("B"))
+            _segment_file.flush()
+
+        image_id = _next_id
+        _append_entry(image_id, _segment, offset, width, height)
+        _index[image_id] = (_segment, offset, width, height)
+        _next_id += 1
+
+        # Retention: the oldest images beyond MAX_IMAGES are deleted.
+        while len(_index) > MAX_IMAGES:
+            delete(next(iter(_index)))
+        return image_id
+
+def delete(image_id):
+    """
+    Deletes an image from the index; its bytes stay in the segment until the next compaction.
+
+    :param image_id: The id of the image.
+    """
+    global _dead_bytes
+    with _lock:
+        _load()
+        entry = _index.pop(image_id, None)
+        if entry is not None:
+            _append_entry(image_id, _DELETED, 0, 0, 0)
+            _dead_bytes += entry[2] * entry[3] * 3
+
+def read(image_id):
+    """
+    Gives the pixels of an archived image without copying them.
+
+    :param image_id: The id of the image.
+    :return: A read-only (height x width x 3) uint8 NumPy view of the mapped segment, or None if there is no such image.
+    :raises OSError: If the archive couldn't be read.
+    """
+    with _lock:
+        entry = _index.get(image_id)
+        if entry is None:
+            # Maybe stored since the last look (e.g. by the network process).
+            _load()
+            entry = _index.get(image_id)
+            if entry is None:
+                return None
+        try:
+            return _view(entry)
+        except FileNotFoundError:
+            # The segment was removed by a compaction in another process: reload the new index and retry once.
+            _load()
+            entry = _index.get(image_id)
+            return _view(entry) if entry is not None else None
+
+def _view(entry):
+    """
+    :param entry: An index entry (segment, offset, width, height).
+    :return: A read-only NumPy view of the pixels of the entry in the mapped segment.
+    :raises FileNotFoundError: If the segment doesn't exist anymore.
+    """
+    segment, offset, width, height = entry
+    size = width * height * 3
+    if size == 0:
+        return np.zeros((height, width, 3), dtype=np.uint8)    # Nothing to map.
+    segment_map = _maps.get(segment)
+    if segment_map is None or len(segment_map) < offset + size:
+        # Map the segment (again, if it grew since it was mapped). An older map stays
+        # valid for the views still using it and is closed when they are gone.
+        with open(_path(_segment_name(segment)), "rb") as file:
+            segment_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        _maps[segment] = segment_map
+    return np.frombuffer(segment_map, dtype=np.uint8, count=size, offset=offset).reshape((height, width, 3))
+
+def ids():
+    """
+    :return: The ids of the archived images, oldest first.
+    """
+    with _lock:
+        _load()
+        return list(_index)
+
+def export(image_id, path):
+    """
+    Writes an archived image to a regular image file (the format is chosen from the extension).
+
+    :param image_id: The id of the image.
+    :param path: The path of the file to write.
+    :return: True if the image was exported, False if there is no such image.
+    :raises OSError: If the file couldn't be written.
+    """
+    array = read(image_id)
+    if array is None:
+        return False
+    Image.fromarray(array, "RGB").save(path)
+    return True
+
+def close():
+    """
+    Closes the open files and forgets the loaded state, e.g. before pointing ARCHIVE_DIR somewhere else.
+
+    Views returned by read() stay valid; their maps are closed once they are gone.
+    """
+    global _index_pos, _index_inode, _index_file, _next_id, _segment, _segment_file, _dead_bytes
+    with _lock:
+        if _segment_file is not None:
+            _segment_file.close()
+        if _index_file is not None:
+            _index_file.close()
+        _index.clear()
+        _maps.clear()
+        _index_pos = 0
+        _index_inode = None
+        _index_file = None
+        _next_id = 0
+        _segment = 0
+        _segment_file = None
+        _dead_bytes = None
+
+# ==========================================================
+#                        COMPACTION
+# ==========================================================
+
+def compact():
+    """
+    Rewrites the live images into new segments and replaces the index, reclaiming the space of the deleted images.
+
+    The new index replaces the old one atomically, so a crash leaves either archive complete.
+    """
+    global _index_file, _index_pos, _index_inode, _segment, _segment_file, _dead_bytes
+    with _lock:
+        _load()
+        # Every existing segment goes, including those that only hold deleted images.
+        old_segments = [name for name in os.listdir(ARCHIVE_DIR) if name.startswith("segment-")]
+        if _segment_file is not None:
+            _segment_file.close()
+            _segment_file = None
+        if _index_file is not None:
+            _index_file.close()
+            _index_file = None
+
+        # New segments are numbered after the old ones, so that no file is overwritten.
+        segment = _segment + 1
+        new_index = dict()
+        output = open(_path(_segment_name(segment)), "wb")
+        try:
+            for image_id in list(_index):
+                array = read(image_id)
+                if output.tell() > 0 and output.tell() + array.nbytes > SEGMENT_SIZE:
+                    output.close()
+                    segment += 1
+                    output = open(_path(_segment_name(segment)), "wb")
+                new_index[image_id] = (segment, output.tell(), array.shape[1], array.shape[0])
+                if array.nbytes > 0:
+                    output.write(memoryview(array).cast("B"))
+                del array
+        finally:
+            output.close()
+
+        temporary = _path(_INDEX_NAME + ".tmp")
+        with open(temporary, "wb") as file:
+            file.write(_HEADER.pack(_next_id))
+            for image_id, (seg, offset, width, height) in new_index.items():
+                file.write(_ENTRY.pack(image_id, seg, offset, width, height))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, _path(_INDEX_NAME))
+
+        _index.clear()
+        _index.update(new_index)
+        _index_pos = _HEADER.size + len(new_index) * _ENTRY.size
+        _index_inode = os.stat(_path(_INDEX_NAME)).st_ino
+        _segment = segment
+        _dead_bytes = 0
+
+        # The old maps are dropped (views still using them keep them open until they are gone).
+        _maps.clear()
+        for old in old_segments:
+            try:
+                os.remove(_path(old))
+            except OSError:
+                pass    # Still mapped on a platform that doesn't allow it (Windows): removed by a later compaction.
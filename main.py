@@ -2,20 +2,29 @@
 import server_interaction
 # Import the custom module that creates and manages the application window.
 import window
-# Import threading module to run the server connection concurrently.
-import threading
+# Import the custom module running the networking in a separate process.
+import network_process
+# Import the flight recorder, dumped on crashes, on SIGUSR1 and with '/trace dump'.
+import recorder
+# Import sys to read the command-line options.
+import sys
 
 # The following code block will only be executed when this script is run directly,
 # and not when it is imported as a module in another script.
 if __name__ == '__main__': 
+    # Dump the last events on any uncaught exception, including in the connection threads.
+    recorder.install()
     try:
         # Inform the user that the connection to the server is starting.
         print("Starting connection to server...")
-        # Create a new thread that will run the open_connection function from the server_interaction module.
-        # The daemon=True flag ensures the thread will not block the program from exiting.
-        s = threading.Thread(target=server_interaction.open_connection, daemon=True)
-        # Start the server connection thread.
-        s.start()
+        if "--multiprocess" in sys.argv:
+            # Run the socket, the frame decoding and the crypto tasks in a separate process,
+            # so that large image bursts and the UI don't compete for the same interpreter.
+            network_process.start()
+        else:
+            # Start the connection supervisor thread from the server_interaction module.
+            # It connects, receives the messages and reconnects on its own when the connection is lost.
+            server_interaction.start_connection()
 
         # Inform the user that the window (UI) is starting.
         print("Starting window...")
@@ -0,0 +1,220 @@
+# ==========================================================
+#               IMPORTS AND GLOBAL DEFINITIONS
+# ==========================================================
+
+import multiprocessing              # Runs the network and the frame decoding in a separate process.
+import pickle                       # Serializes the (small) arguments of the forwarded signals.
+import threading                    # Runs the listener of the GUI process next to the Qt event loop.
+
+from shm_ring import SharedRing     # Shared memory ring carrying the decoded frames between the processes.
+
+# Note: server_interaction and crypto_interaction are only imported inside the network
+# process, so that their 'comm' can be replaced before any frame is handled.
+
+# Size of the shared memory ring (large enough for several full 255x255 images).
+RING_CAPACITY = 4 * 1024 * 1024
+
+# Seconds to wait for free space in the ring before sending a message through the pipe instead
+# (e.g. while the GUI is busy); images are then read from the image archive.
+RING_TIMEOUT = 0.5
+
+# State of the multi-process mode, on the GUI side:
+_process = None                     # The network process (None in single-process mode).
+_pipe = None                        # GUI end of the notification pipe.
+_ring = None                        # The shared memory ring (created by the GUI process).
+_listener = None                    # Thread turning notifications back into Qt signals.
+
+# ==========================================================
+#            NETWORK PROCESS SIDE (SIGNAL FORWARDING)
+# ==========================================================
+
+class _RemoteSignal:
+    def __init__(self, remote, name):
+        """
+        Stand-in for a pyqtSignal of 'comm' inside the network process.
+
+        :param remote: The _RemoteComm forwarding the emissions.
+        :param name: The name of the signal on the GUI side (e.g. "chat_msg").
+        """
+        self.remote = remote
+        self.name = name
+
+    def emit(self, *args):
+        self.remote.post(self.name, args)
+
+class _RemoteComm:
+    def __init__(self, pipe, ring):
+        """
+        Replaces 'comm' in the network process: every emission is written to the shared
+        ring and only its position crosses the pipe.
+
+        :param pipe: Network end of the notification pipe.
+        :param ring: The shared memory ring, attached by name.
+        """
+        self.pipe = pipe
+        self.ring = ring
+        # The supervisor thread and the input handling both emit: one writer at a time.
+        self.lock = threading.Lock()
+        self.chat_msg = _RemoteSignal(self, "chat_msg")
+        self.chat_msg_part = _RemoteSignal(self, "chat_msg_part")
+        self.chat_img = _RemoteSignal(self, "chat_img")
+        self.chat_img_rows = _RemoteSignal(self, "chat_img_rows")
+        self.connection_state = _RemoteSignal(self, "connection_state")
+
+    def post(self, name, args):
+        """
+        Forwards a signal emission to the GUI process.
+
+        :param name: The name of the signal.
+        :param args: The arguments of the emission.
+        """
+        payload = pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            start = self.ring.write(payload, RING_TIMEOUT) if self.ring.fits(len(payload)) else None
+            if start is not None:
+                self.pipe.send(("emit", name, start, len(payload)))
+            else:
+                # Too big for the ring (e.g. a huge chat message) or ring full: send it through the pipe.
+                self.pipe.send(("emit_inline", name, payload))
+
+    def publish_image(self, incr, array):
+        """
+        Copies the raw RGB pixels of a received image to the GUI process.
+
+        Used as 'server_interaction.image_hook', before 'chat_img' announces the image,
+        so that the GUI displays it without reading it back from the image archive.
+
+        :param incr: The image counter.
+        :param array: The image as a (height x width x 3) uint8 NumPy array.
+        """
+        height, width = array.shape[:2]
+        with self.lock:
+            start = self.ring.write(array, RING_TIMEOUT) if self.ring.fits(array.nbytes) else None
+            if start is not None:
+                self.pipe.send(("image", incr, width, height, start, array.nbytes))
+
+def _network_main(pipe, ring_name, capacity):
+    """
+    Entry point of the network process: owns the socket, decodes the frames and solves the crypto tasks.
+
+    :param pipe: Network end of the notification pipe.
+    :param ring_name: The name of the shared memory ring created by the GUI process.
+    :param capacity: The size of the ring.
+    """
+    import server_interaction
+    import crypto_interaction
+    import window
+    import recorder
+
+    # This process has its own flight recorder; its crashes are dumped as well.
+    recorder.install()
+
+    ring = SharedRing(capacity, name=ring_name)
+    remote = _RemoteComm(pipe, ring)
+    # Redirect every emission of the modules running here to the GUI process.
+    server_interaction.comm = remote
+    crypto_interaction.comm = remote
+    window.comm = remote
+    server_interaction.image_hook = remote.publish_image
+
+    server_interaction.start_connection()
+    try:
+        while True:
+            message = pipe.recv()
+            if message[0] == "input":
+                # Text entered in the GUI: handled here so that the task flags live next to the socket.
+                window.process_input(message[1])
+            elif message[0] == "stop":
+                break
+    except EOFError:
+        pass    # The GUI process is gone.
+    finally:
+        server_interaction.stop_connection()
+        ring.close()
+
+# ==========================================================
+#             GUI PROCESS SIDE (START, INPUT, LISTEN)
+# ==========================================================
+
+def is_running():
+    """
+    :return: True if the multi-process mode is active.
+    """
+    return _process is not None
+
+def start():
+    """
+    Starts the network process and the listener thread forwarding its notifications to the UI.
+    """
+    global _process, _pipe, _ring, _listener
+    if _process is not None:
+        return
+    # "spawn" gives the network process fresh modules (no copy of the Qt state of the GUI process).
+    context = multiprocessing.get_context("spawn")
+    _ring = SharedRing(RING_CAPACITY)
+    _pipe, child_pipe = context.Pipe()
+    _process = context.Process(target=_network_main, args=(child_pipe, _ring.name, RING_CAPACITY), daemon=True)
+    _process.start()
+    child_pipe.close()
+
+    _listener = threading.Thread(target=_listen, daemon=True)
+    _listener.start()
+
+def send_input(text):
+    """
+    Hands a line entered in the GUI to the network process.
+
+    :param text: The text of the message input.
+    """
+    _pipe.send(("input", text))
+
+def stop():
+    """
+    Stops the network process and frees the shared memory ring.
+    """
+    global _process
+    if _process is None:
+        return
+    try:
+        _pipe.send(("stop",))
+    except OSError:
+        pass    # The network process already exited.
+    _process.join(timeout=2)
+    if _process.is_alive():
+        _process.terminate()
+    _process = None
+    _listener.join(timeout=1)
+    _ring.close()
+
+def _listen():
+    """
+    Receives the notifications of the network process and emits the matching Qt signals.
+
+    Qt queues signals emitted from this thread to the main thread, so the UI only ever
+    copies finished data out of the ring.
+    """
+    from communicator import comm
+    from PySide6.QtGui import QImage
+    import window
+
+    while True:
+        try:
+            message = _pipe.recv()
+        except (EOFError, OSError):
+            break
+
+        match message[0]:
+            case "emit":
+                _, name, start, length = message
+                args = pickle.loads(_ring.view(start, length))
+                _ring.release(start + length)
+                getattr(comm, name).emit(*args)
+            case "emit_inline":
+                _, name, payload = message
+                getattr(comm, name).emit(*pickle.loads(payload))
+            case "image":
+                _, incr, width, height, start, length = message
+                # QImage.copy() detaches the pixels from the ring before the space is released.
+                image = QImage(_ring.view(start, length), width, height, width * 3, QImage.Format.Format_RGB888).copy()
+                _ring.release(start + length)
+                window.image_cache[incr] = image
@@ -0,0 +1,117 @@
+# ==========================================================
+#               IMPORTS AND GLOBAL DEFINITIONS
+# ==========================================================
+
+import itertools                    # Atomic event counter (next() on a count is a single C call).
+import os                           # Process id in the dump file names, creation of the dump directory.
+import signal                       # Dump on SIGUSR1 (where the platform has it).
+import sys                          # Hook for the uncaught exceptions of the main thread.
+import threading                    # Hook for the uncaught exceptions of the other threads.
+import time                         # Timestamps of the events and of the dump files.
+import traceback                    # Formats the exception that triggered a dump.
+
+# Number of events kept; older ones are overwritten.
+CAPACITY = 4096
+
+# Directory receiving the dump files.
+DUMP_DIR = "traces"
+
+# Set to False to make record() return right away.
+enabled = True
+
+# The ring: a fixed list of slots, each holding (time, thread name, kind, details) or None.
+# It is allocated once, so recording an event only stores a reference in an existing slot.
+_slots = [None] * CAPACITY
+_counter = itertools.count()        # Number of events recorded so far (the next slot is this modulo CAPACITY).
+
+# Reference time of the event timestamps.
+_start = time.monotonic()
+
+# Number of dumps written by this process, so that two dumps in the same second get different files.
+_dumps = itertools.count(1)
+
+# Hooks replaced by install(), called after the dump.
+_previous_excepthook = None
+_previous_thread_excepthook = None
+
+# ==========================================================
+#                     RECORDING EVENTS
+# ==========================================================
+
+def record(kind, *details):
+    """
+    Records an event in the ring.
+
+    This is the only function called on the hot paths: it stores a tuple in a preallocated
+    slot and formats nothing; the details are only turned into text by dump().
+
+    :param kind: A short name for the kind of event (e.g. "frame_in", "reconnect").
+    :param details: Any values describing the event (e.g. frame type and length).
+    """
+    if enabled:
+        _slots[next(_counter) % CAPACITY] = (time.monotonic(), threading.current_thread().name, kind, details)
+
+def events():
+    """
+    :return: The recorded events still in the ring, oldest first.
+    """
+    # Copy the slots first: other threads may keep recording while the copy is sorted.
+    return sorted((event for event in list(_slots) if event is not None), key=lambda event: event[0])
+
+# ==========================================================
+#                          DUMPING
+# ==========================================================
+
+def dump(reason="on demand", error=None):
+    """
+    Writes the recorded events to a new file of DUMP_DIR.
+
+    :param reason: Why the trace is dumped, written in the header of the file.
+    :param error: (Optional) A tuple (type, value, traceback) of the exception that triggered the dump.
+    :return: The path of the written file, or None if it couldn't be written.
+    """
+    path = os.path.join(DUMP_DIR, "trace-" + time.strftime("%Y%m%d-%H%M%S") + "-" + str(os.getpid())
+                        + "-" + str(next(_dumps)) + ".txt")
+    try:
+        os.makedirs(DUMP_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("# ISC flight recorder, " + reason + "\n")
+            for timestamp, thread, kind, details in events():
+                file.write("%12.6f %-20s %-12s %s\n" % (timestamp - _start, thread, kind, " ".join(str(d) for d in details)))
+            if error is not None:
+                file.write("\n" + "".join(traceback.format_exception(*error)))
+    except OSError as e:
+        print("[Recorder] The trace couldn't be written.")
+        print(e)
+        return None
+    return path
+
+def _excepthook(exc_type, exc_value, exc_traceback):
+    dump("uncaught exception in the main thread", (exc_type, exc_value, exc_traceback))
+    _previous_excepthook(exc_type, exc_value, exc_traceback)
+
+def _thread_excepthook(args):
+    # A reception or image thread dying must leave a trace instead of disappearing silently.
+    thread = args.thread.name if args.thread is not None else "unknown thread"
+    dump("uncaught exception in " + thread, (args.exc_type, args.exc_value, args.exc_traceback))
+    _previous_thread_excepthook(args)
+
+def _on_signal(signum, frame):
+    print("[Recorder] Trace written to " + str(dump("on SIGUSR1")))
+
+def install():
+    """
+    Dumps the trace on any uncaught exception (main thread or other threads) and on SIGUSR1.
+
+    Must be called from the main thread (signal handlers can only be set there).
+    """
+    global _previous_excepthook, _previous_thread_excepthook
+    if _previous_excepthook is not None:
+        return
+    _previous_excepthook = sys.excepthook
+    _previous_thread_excepthook = threading.excepthook
+    sys.excepthook = _excepthook
+    threading.excepthook = _thread_excepthook
+    # SIGUSR1 doesn't exist on Windows; the chat command still works there.
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, _on_signal)
@@ -4,39 +4,116 @@
 
 import socket                       # Provides functions for creating and using network sockets.
 import threading                    # Enables running tasks concurrently in separate threads.
+import random                       # Used to add jitter to the reconnection delays.
+import time                         # Used to measure how long a connection stayed up.
 import window                       # Custom module to interact with the UI (details assumed to be in the module).
 import crypto_interaction           # Custom module for cryptographic operations (e.g., encryption/decryption).
-
-# Note: The threading module is imported twice; one of these can be removed.
-import threading
+import e2e_interaction              # Custom module sealing the chat messages end-to-end between clients.
+import recorder                     # Flight recorder keeping the last events for post-mortem traces.
+import image_archive                # Append-only archive of the received images.
+import buffer_pool                  # Reusable buffers receiving the pixels of the images.
 
 from communicator import comm       # Imports the 'comm' object used for emitting chat-related signals.
 
-from PIL import Image               # PIL (Pillow) is used here to handle image creation and saving.
+from PIL import Image               # PIL (Pillow) is used here to load and resize the images to send.
 import numpy as np                  # Numpy is used for efficient array operations, especially with image data.
 
 # Server connection details:
 HOST = 'vlbelintrocrypto.hevs.ch'   # The hostname of the server to connect to.
 PORT = 6000                         # The port on which the server is listening.
 
+# Connection tuning:
+CONNECT_TIMEOUT = 10                # Seconds allowed to establish the TCP connection.
+READ_TIMEOUT = 30                   # Seconds without data before the reception loop checks the link again.
+RECV_BUFFER_SIZE = None             # SO_RCVBUF in bytes (None keeps the system default).
+SEND_BUFFER_SIZE = None             # SO_SNDBUF in bytes (None keeps the system default).
+KEEPALIVE_IDLE = 30                 # Seconds of silence before the first TCP keepalive probe.
+KEEPALIVE_INTERVAL = 10             # Seconds between two keepalive probes.
+KEEPALIVE_COUNT = 3                 # Unanswered probes before the connection is considered dead.
+
+# Reconnection backoff: the delay doubles after each failure, up to the maximum,
+# and a random part of it is actually waited (full jitter) so that clients don't reconnect in lockstep.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+STABLE_CONNECTION_TIME = 10         # Seconds a connection must stay up before the backoff starts over.
+
 # Default mode for messages (e.g., 't' for text).
 mode = "t"
 
+# Message size limits:
+MAX_FRAME_CHARS = 65535             # The character count of a frame is stored on 2 bytes.
+FRAGMENT_CHARS = 16384              # Characters of text per fragment of a long chat message.
+MAX_MESSAGE_CHARS = 16 * 1024 * 1024    # Longest fragmented message accepted from another client.
+MAX_PENDING_MESSAGES = 16           # Fragmented messages being received at the same time.
+
+# Fragments of long chat messages are sent as 't' frames starting with
+# "FRAG:<message id>:<sequence number>:<fragment count>:" followed by the text of the fragment.
+# A short message that starts with the prefix itself (or with BENCH_PREFIX) is sent as a single
+# fragment, so that receivers never mistake it for one.
+FRAGMENT_PREFIX = "FRAG:"
+
+# Fragmented messages being received, by message id:
+# [next expected sequence number, fragment count, received characters, chunks (sealed messages only) or None]
+_incoming_fragments = dict()
+
+# Ids of our own fragmented messages, to skip their echo.
+_own_fragment_ids = set()
+
+# Image frames store the width and the height on one byte each.
+MAX_IMAGE_SIDE = 255
+MAX_IMAGE_TILES = 4                 # Tiles per side when sending a large image as several frames.
+PROGRESS_ROWS = 32                  # Complete rows received between two partial updates of an incoming image.
+IMAGE_RECV_SIZE = 65536             # Largest read while receiving the pixels of an image.
+
+# Buffers receiving the pixels of the images; a full image (255x255) fits in the largest class.
+_image_pool = buffer_pool.BufferPool()
+
+# Round-trip benchmark ('/bench ping N'): the pings are "BENCH:<run id>:<sequence number>"
+# messages, matched with their echo through their own table instead of 'last_own_sent_message'.
+BENCH_PREFIX = "BENCH:"
+BENCH_WINDOW = 8                    # Pings in flight at the same time.
+BENCH_TIMEOUT = 5                   # Seconds without any echo before the run is given up.
+_bench_pending = dict()             # Ping text -> time it was sent, for the pings still in flight.
+_bench_rtts = list()                # Round-trip times (seconds) of the current run.
+_bench_slots = threading.Semaphore(BENCH_WINDOW)  # Free places in the window of the current run.
+_bench_lock = threading.Lock()
+_bench_running = False
+
+# Held while a frame is written to the socket, so that frames sent from different threads
+# (UI, image sending) never interleave.
+_send_lock = threading.Lock()
+
 # Variables to hold image dimensions:
 width = 0                           # Will later store the width of a received image.
 length = 0                          # Intended for image length (or height); note that this variable is not used directly.
 
-incr = 0                            # Image increment counter for naming saved images uniquely.
+incr = 0                            # Id of the image being received (ids come from the image archive and persist across launches).
 
-# Connection state indicators:
+# Connection state indicators (changes are emitted through 'comm.connection_state'):
 # -1: Not connected yet
-#  0: Connection attempt failed
+#  0: Connection attempt failed (waiting before the next attempt)
 #  1: Successfully connected
+#  2: Connecting
 connection_state = -1  
 
+# The socket of the current connection (None while disconnected).
+connection = None
+
+# Set to stop the connection supervisor and the reconnection attempts.
+_stop_event = threading.Event()
+
+# The thread running the connection supervisor; only one may exist.
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
 # Stores the last message sent by the user. This is used to filter out echo messages received from the server.
 last_own_sent_message = ""
 
+# Optional callable receiving (incr, array) for every received image before 'comm.chat_img' is emitted.
+# Set by the network process to hand the raw pixels to the GUI process. The array is only valid
+# during the call: its buffer is reused for the next image.
+image_hook = None
+
 # ==========================================================
 #         MESSAGE ENCODING & DECODING FUNCTIONS
 # ==========================================================
@@ -56,6 +133,7 @@ def _str_encode(type, msg):
     :param type: A string representing the type of message (e.g., 't' for text).
     :param msg: The message content to encode; either a string or bytearray.
     :return: A bytes object representing the encoded message ready for sending.
+    :raises ValueError: If the message has more characters than a frame can announce (MAX_FRAME_CHARS).
     """
     lengthMsg = 0
     if isinstance(msg, str):
@@ -65,6 +143,9 @@ def _str_encode(type, msg):
         # If not a string, assume each character was padded to 4 bytes.
         lengthMsg = len(msg) / 4
 
+    if int(lengthMsg) > MAX_FRAME_CHARS:
+        raise ValueError("Message too long for a single ISC frame: " + str(int(lengthMsg)) + " characters")
+
     # Build the ISC header:
     # b'ISC' is a fixed header.
     # Next is the message type encoded in UTF-8.
@@ -72,11 +153,14 @@ def _str_encode(type, msg):
     message = b'ISC' + type.encode('utf-8') + int(lengthMsg).to_bytes(2, byteorder='big')
 
     if isinstance(msg, str):
-        # For each character in the string, encode to UTF-8.
-        # Each character is padded with null bytes so that each takes up 4 bytes.
-        for s in msg:
-            encoded = s.encode('utf-8')
-            message += (4 - len(encoded)) * b'\x00' + encoded
+        if msg.isascii():
+            # For ASCII text, UTF-32 big-endian is exactly each character padded with 3 null bytes,
+            # encoded in a single call instead of a loop over the characters.
+            message += msg.encode('utf-32-be')
+        else:
+            # For each character in the string, encode to UTF-8.
+            # Each character is padded with null bytes so that each takes up 4 bytes.
+            message += b''.join((4 - len(encoded)) * b'\x00' + encoded for encoded in (s.encode('utf-8') for s in msg))
     else:
         # If the message is already in bytes (or a bytearray), append it directly.
         message += msg
@@ -93,46 +177,281 @@ def _decode_message(text):
     # Decode using UTF-8 (ignoring errors), then remove any null (padding) characters.
     return text.decode("utf-8", errors="ignore").replace("\x00", "")
 
+# ==========================================================
+#         FRAGMENTATION & STREAMING REASSEMBLY
+# ==========================================================
+
+def _fragment(text):
+    """
+    Splits a long text into sequenced fragments, each small enough for one ISC frame.
+
+    :param text: The text to split.
+    :return: A tuple (message id, list of fragment texts).
+    """
+    msg_id = format(random.getrandbits(32), "08x")
+    count = -(-len(text) // FRAGMENT_CHARS)
+    header = FRAGMENT_PREFIX + msg_id + ":"
+    return msg_id, [header + str(seq) + ":" + str(count) + ":" + text[seq * FRAGMENT_CHARS:(seq + 1) * FRAGMENT_CHARS]
+                    for seq in range(count)]
+
+def _handle_fragment(text):
+    """
+    Handles a received fragment and delivers its text to the UI right away.
+
+    Only the position in each message is kept, not its text, so memory stays bounded
+    whatever the size of the message. Sealed (end-to-end) messages are the exception:
+    they can only be opened whole, so their chunks are kept up to MAX_MESSAGE_CHARS.
+
+    :param text: The decoded fragment (starting with FRAGMENT_PREFIX).
+    """
+    try:
+        _, msg_id, seq, count, chunk = text.split(":", 4)
+        seq, count = int(seq), int(count)
+    except ValueError:
+        return    # Malformed fragment.
+
+    if msg_id in _own_fragment_ids:
+        # Echo of one of our own messages.
+        if seq == count - 1:
+            _own_fragment_ids.discard(msg_id)
+        return
+
+    if seq == 0:
+        if len(_incoming_fragments) >= MAX_PENDING_MESSAGES:
+            # Forget the oldest unfinished message (e.g. its sender disconnected).
+            oldest = next(iter(_incoming_fragments))
+            del _incoming_fragments[oldest]
+            comm.chat_msg_part.emit("", oldest, "", True)
+        sealed = chunk.startswith(e2e_interaction.SEALED_PREFIX)
+        _incoming_fragments[msg_id] = [0, count, 0, [] if sealed else None]
+
+    state = _incoming_fragments.get(msg_id)
+    if state is None:
+        return    # Start of the message missed, or message dropped.
+    if seq != state[0] or count != state[1] or state[2] + len(chunk) > MAX_MESSAGE_CHARS:
+        del _incoming_fragments[msg_id]
+        comm.chat_msg_part.emit("", msg_id, "", True)
+        comm.chat_msg.emit("[Client] ", "A long message was dropped (out of order or over the size limit).")
+        return
+
+    state[0] += 1
+    state[2] += len(chunk)
+    if state[3] is None:
+        # Plain text: stream the chunk to the UI, into the message it belongs to.
+        comm.chat_msg_part.emit("[User] ", msg_id, chunk, state[0] == count)
+    else:
+        state[3].append(chunk)
+
+    if state[0] == count:
+        del _incoming_fragments[msg_id]
+        if state[3] is not None:
+            opened = e2e_interaction.open_sealed("".join(state[3]))
+            comm.chat_msg.emit("[User] ", opened if opened is not None else "<end-to-end message that can't be decrypted>")
+
 # ==========================================================
 #         SERVER CONNECTION MANAGEMENT FUNCTIONS
 # ==========================================================
 
-def open_connection():
+def _set_connection_state(state):
     """
-    Establishes a connection to the server and launches a thread to handle incoming messages.
+    Updates the connection state and notifies the UI when it changes.
+
+    :param state: The new connection state (see 'connection_state').
     """
     global connection_state
-    global connection
+    if state != connection_state:
+        connection_state = state
+        comm.connection_state.emit(state)
+
+def _configure_socket(sock):
+    """
+    Applies the socket options used for the chat connection.
+
+    - TCP_NODELAY sends the small interactive frames (tasks, short messages) immediately.
+    - TCP keepalive detects a dead server even when nobody is talking.
+    - The kernel buffer sizes are only changed when configured.
+
+    :param sock: The socket to configure (before connecting).
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # The keepalive timings are platform specific; set the ones that exist.
+    for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+                          ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                          ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+    if RECV_BUFFER_SIZE:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_SIZE)
+    if SEND_BUFFER_SIZE:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+
+def open_connection():
+    """
+    Establishes a single connection to the server.
+
+    :return: The connected and configured socket.
+    :raises OSError: If the connection couldn't be established (refused, unknown host, timeout...).
+    """
+    # Create a TCP/IP socket.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
-        # Create a TCP/IP socket.
-        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        _configure_socket(sock)
+        sock.settimeout(CONNECT_TIMEOUT)
         # Attempt to connect to the server using the predefined HOST and PORT.
-        connection.connect((HOST, PORT))
-    except (ConnectionRefusedError, socket.gaierror) as e:
-        # In case of connection failure, output an error message.
-        print("[ServerInteraction] The connection couldn't be established.")
-        print(e)
-        connection_state = 0  # Update connection state to indicate failure.
-        exit(1)             # Exit the program.
+        sock.connect((HOST, PORT))
+        sock.settimeout(READ_TIMEOUT)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def supervise_connection():
+    """
+    Owns the connection: connects, runs the message reception and reconnects with backoff when the link is lost.
+
+    This is the only place where connections are opened, so a reconnection storm can
+    never leave several reception threads or sockets behind.
+    """
+    global connection
+    attempt = 0
+    while not _stop_event.is_set():
+        _set_connection_state(2)
+        recorder.record("connect", "attempt", attempt)
+        try:
+            connection = open_connection()
+        except OSError as e:
+            # In case of connection failure, output an error message and wait before retrying.
+            print("[ServerInteraction] The connection couldn't be established.")
+            print(e)
+            _set_connection_state(0)
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            recorder.record("connect", "failed", repr(e), "retry in %.2fs" % delay)
+            _stop_event.wait(delay)
+            attempt += 1
+            continue
+
+        print("Connection open")    # Confirm a successful connection.
+        recorder.record("connect", "open")
+        _set_connection_state(1)
+        connected_at = time.monotonic()
+
+        try:
+            handle_message_reception()
+        except OSError as e:
+            # Connection errors, timeouts in the middle of a frame and closed sockets all end here.
+            print("[ServerInteraction] The connection was lost.")
+            print(e)
+            recorder.record("connect", "lost", repr(e))
+        except Exception as e:
+            # A bug while handling a frame (e.g. an unexpected server message in a crypto task)
+            # must not end the only owner of the connection: trace it and reconnect.
+            print("[ServerInteraction] Error while handling a message, reconnecting.")
+            print(repr(e))
+            recorder.record("connect", "error", repr(e))
+            recorder.dump("error in the reception loop", (type(e), e, e.__traceback__))
+        finally:
+            close_connection()
 
-    print("Connection open")    # Confirm a successful connection.
-    connection_state = 1        # Set the connection state to 'connected'.
+        # A server accepting and dropping connections right away must not cause a reconnection
+        # storm: the backoff only starts over once a connection has stayed up for a while.
+        if time.monotonic() - connected_at >= STABLE_CONNECTION_TIME:
+            attempt = 0
+        if not _stop_event.is_set():
+            _set_connection_state(0)
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            recorder.record("connect", "reconnect in %.2fs" % delay)
+            _stop_event.wait(delay)
+            attempt += 1
 
-    try:
-        # Create and start a new thread to continuously receive messages from the server.
-        t = threading.Thread(target=handle_message_reception)
-        t.start()
-    except KeyboardInterrupt:
-        # If the user interrupts (e.g., Ctrl+C), close the connection.
-        print("Stopped by Ctrl+C")
-        close_connection()
+    _set_connection_state(-1)
+
+def start_connection():
+    """
+    Starts the connection supervisor thread, unless it is already running.
+    """
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is not None and _supervisor.is_alive():
+            return
+        _stop_event.clear()
+        _supervisor = threading.Thread(target=supervise_connection, daemon=True)
+        _supervisor.start()
 
 def close_connection():
     """
     Closes the active connection to the server and prints a confirmation message.
     """
-    connection.close()
-    print("Connection closed")
+    global connection
+    sock, connection = connection, None
+    if sock is not None:
+        sock.close()
+        print("Connection closed")
+
+def _abort_connection(sock):
+    """
+    Shuts a socket down after a failed send, so that the supervisor reconnects.
+
+    A send that timed out may have left part of a frame on the wire; every later frame on
+    the same connection would be misread by the server.
+
+    :param sock: The socket the send failed on.
+    """
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass    # Already disconnected.
+
+def stop_connection():
+    """
+    Stops the connection supervisor and closes the active connection.
+    """
+    _stop_event.set()
+    sock = connection
+    if sock is not None:
+        try:
+            # Unblock the reception loop; the supervisor then closes the socket and exits.
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass    # Already disconnected.
+
+def _recv_into(view):
+    """
+    Receives the bytes available on the connection (at most IMAGE_RECV_SIZE) straight into a buffer.
+
+    :param view: A writable memoryview of the part of the buffer still to fill.
+    :return: The number of bytes received (at least 1).
+    :raises ConnectionError: If the server closed the connection or stopped sending in the middle of a frame.
+    """
+    try:
+        received = connection.recv_into(view, min(len(view), IMAGE_RECV_SIZE))
+    except socket.timeout:
+        raise ConnectionError("Read timed out in the middle of a frame")
+    if received == 0:
+        raise ConnectionError("Connection closed by the server")
+    return received
+
+def _recv_exact(size, idle_ok=False):
+    """
+    Receives exactly 'size' bytes from the connection.
+
+    :param size: The number of bytes to receive.
+    :param idle_ok: If True, a read timeout before any byte arrived is re-raised as is (idle link).
+    :return: The received bytes.
+    :raises ConnectionError: If the server closed the connection or stopped sending in the middle of a frame.
+    """
+    data = bytearray()
+    while len(data) < size:
+        try:
+            chunk = connection.recv(size - len(data))
+        except socket.timeout:
+            if idle_ok and len(data) == 0:
+                raise
+            raise ConnectionError("Read timed out in the middle of a frame")
+        if not chunk:
+            raise ConnectionError("Connection closed by the server")
+        data.extend(chunk)
+    return bytes(data)
 
 # ==========================================================
 #             MESSAGE HANDLING FUNCTIONS
@@ -140,90 +459,149 @@ def close_connection():
 
 def handle_message_reception():
     """
-    Listens continuously for incoming messages from the server.
+    Listens continuously for incoming messages from the server, until the connection is lost.
 
-    - For image messages ('i'), it receives image dimensions, collects image data,
-      reconstructs and saves the image, and emits a signal to update the UI.
+    - For image messages ('i'), it receives image dimensions, collects image data (showing
+      the complete rows as they arrive), reconstructs and saves the image, and emits a signal to update the UI.
     - For other message types, it receives and decodes the message, then updates the UI
       if the message is new.
+
+    :raises OSError: When the connection is lost (handled by the connection supervisor).
     """
-    while True:
+    global last_own_sent_message
+    while not _stop_event.is_set():
         try:
             # Discard the first 3 bytes (fixed ISC header 'ISC').
-            connection.recv(3)
-
-            # Receive the next byte which indicates the message type.
-            type = connection.recv(1).decode("utf-8", errors="ignore")
-
-            data = bytearray()
-
-            global width
-            global length
-            global incr
-
-            if type == "i":
-                # For image messages:
-                # Receive width and height (each in one byte).
-                width = int.from_bytes(connection.recv(1))
-                height = int.from_bytes(connection.recv(1))
-                img = bytearray()
-                # Calculate the total data length for an RGB image.
-                datalength = width * height * 3
-                # Continue receiving data until the full image is received.
-                while (len(img) < datalength): 
-                    img.extend(connection.recv(3))
-
-                # Convert the collected bytes into a NumPy array.
-                array = np.array(img, dtype=np.uint8)
-
-                # Ensure the array length is a multiple of 3 (for RGB channels) by trimming if necessary.
-                while (len(array) % 3 != 0):
-                    array = array[:-1]
-                
-                # Reshape the array into a 3-dimensional array (height x width x 3).
-                array = array.reshape((height, width, 3))
-
-                # Create an image from the array using PIL.
-                img = Image.fromarray(array, 'RGB')
-
-                # Save the image to the 'imgs' directory with a filename based on the increment counter.
-                img.save("imgs/img" + str(incr) + ".png")
-                # Emit a signal through 'comm.chat_img' to update the UI with the new image.
-                comm.chat_img.emit(incr)
-                incr += 1  # Increment the image counter.
-            else:
-                # For non-image messages, first obtain the message length.
-                # The length is sent as 2 bytes (big-endian) and each character is padded to 4 bytes.
-                msgLength = int.from_bytes(connection.recv(2), byteorder='big') * 4
-                # Receive the message data of the calculated length.
-                data = connection.recv(msgLength)
-        except ConnectionError:
-            # On connection error, close the connection and attempt to reopen it in a new thread.
-            close_connection()
-            s = threading.Thread(target=open_connection, daemon=True)
-            s.start()
+            _recv_exact(3, idle_ok=True)
+        except socket.timeout:
+            # Nothing received for a while: the link is idle, keepalive watches the server.
+            continue
+
+        # Receive the next byte which indicates the message type.
+        type = _recv_exact(1).decode("utf-8", errors="ignore")
+
+        data = bytearray()
+
+        global width
+        global length
+        global incr
+
+        if type == "i":
+            # For image messages:
+            # Receive width and height (each in one byte).
+            width = int.from_bytes(_recv_exact(1))
+            height = int.from_bytes(_recv_exact(1))
+            recorder.record("frame_in", type, str(width) + "x" + str(height))
+            # The id is known before the pixels arrive, so the rows can be shown under it right away.
+            try:
+                incr = image_archive.next_id()
+            except OSError as e:
+                # A broken archive (e.g. 'imgs' not writable) must not drop the connection:
+                # the image is still shown, under the next id of this session.
+                print("[ServerInteraction] The image archive couldn't be read.")
+                print(e)
+                incr += 1
+            # Calculate the total data length for an RGB image.
+            datalength = width * height * 3
+            rowlength = width * 3
+            # The pixels are received in large reads straight into a reusable buffer of the pool.
+            img = _image_pool.acquire(datalength)
+            try:
+                view = memoryview(img)[:datalength]
+                received = 0
+                shown = 0    # Rows already handed to the UI.
+                while received < datalength:
+                    received += _recv_into(view[received:])
+                    rows = received // rowlength
+                    # The first complete rows are shown right away, then every PROGRESS_ROWS rows
+                    # (copied, since the buffer goes back to the pool once the image is handled).
+                    if rows > shown and (shown == 0 or rows - shown >= PROGRESS_ROWS or rows == height):
+                        comm.chat_img_rows.emit(incr, width, height, shown, bytes(view[shown * rowlength:rows * rowlength]))
+                        shown = rows
+                view.release()
+
+                # View the collected bytes as a 3-dimensional array (height x width x 3), without copying them.
+                array = buffer_pool.as_image(img, width, height)
+
+                try:
+                    # One sequential append of the raw pixels instead of compressing a PNG file per image.
+                    image_archive.store(array)
+                except OSError as e:
+                    # The image is still shown; only its archived copy is missing.
+                    print("[ServerInteraction] The image couldn't be archived.")
+                    print(e)
+                if image_hook is not None:
+                    # The hook copies the pixels before returning (see network_process.publish_image).
+                    image_hook(incr, array)
+                del array
+            finally:
+                _image_pool.release(img)
+            # Emit a signal through 'comm.chat_img' to update the UI with the new image.
+            comm.chat_img.emit(incr)
+        else:
+            # For non-image messages, first obtain the message length.
+            # The length is sent as 2 bytes (big-endian) and each character is padded to 4 bytes.
+            msgLength = int.from_bytes(_recv_exact(2), byteorder='big') * 4
+            # Receive the message data of the calculated length.
+            data = _recv_exact(msgLength)
+            recorder.record("frame_in", type, msgLength // 4)
 
         if (type != "i"):
             decoded_data = _decode_message(data)  # Decode the received message data.
 
-            global last_own_sent_message
+            if decoded_data.startswith(BENCH_PREFIX):
+                # Echo of a benchmark ping: neither shown nor handed to the crypto tasks.
+                _handle_bench_echo(decoded_data)
+                continue
+
+            if type == "t" and decoded_data.startswith(e2e_interaction.HANDSHAKE_PREFIX):
+                # End-to-end handshake from another client: derive the session key (and answer if opted in).
+                report_handshake(*e2e_interaction.handle_handshake(decoded_data))
+                continue
+
+            if type == "t" and decoded_data.startswith(FRAGMENT_PREFIX):
+                # Part of a long message: delivered as it arrives.
+                _handle_fragment(decoded_data)
+                continue
+
             # If the decoded message is non-empty and not identical to the last sent message,
             # process it to update the UI.
             if len(decoded_data) != 0 and decoded_data != last_own_sent_message:
                 if type == "t":
                     # Reset last sent message tracking for text messages.
                     last_own_sent_message = ""
+                text = decoded_data
+                if type == "t" and decoded_data.startswith(e2e_interaction.SEALED_PREFIX):
+                    # Sealed message: only shown if it opens with our session key.
+                    text = e2e_interaction.open_sealed(decoded_data)
+                    if text is None:
+                        text = "<end-to-end message that can't be decrypted>"
                 # Emit a signal to update the chat UI with the message.
                 # The sender label is chosen based on the type of message.
                 comm.chat_msg.emit(
                     ("[User] " if type == "t" 
                      else "[Server] " if type == "s" 
                      else "[Other] "),
-                    _decode_message(data))
+                    text)
             
             if type == "s":
-                # For server messages, update the crypto interaction module with the server message.
-                crypto_interaction.appendServerMsg(decoded_data)
+                # For server messages, update the crypto interaction module with the server message
+                # (the raw bytes are kept for tasks working on the 4-byte values, such as RSA decoding).
+                crypto_interaction.appendServerMsg(decoded_data, data)
+
+def report_handshake(reply, status):
+    """
+    Sends the answer of an end-to-end handshake and tells the user what happened.
+
+    :param reply: The handshake text to send back, or None.
+    :param status: The status returned by e2e_interaction.handle_handshake.
+    """
+    if reply is not None:
+        send_message("t", reply)
+    if status == "established":
+        comm.chat_msg.emit("[E2E] ", "Session established, key fingerprint " + e2e_interaction.fingerprint())
+    elif status == "offered":
+        comm.chat_msg.emit("[E2E] ", "A peer offers an end-to-end session; type '/e2e accept' to join it.")
 
 def send_message(type, text):
     """
@@ -239,8 +617,37 @@ def send_message(type, text):
     global last_own_sent_message
     # Only send if there is text and the message type is one of the expected ones.
     if len(text) != 0 and ["t", "s", "b"].count(type) == 1:
-        # Encode the message into ISC format and send it over the connection.
-        connection.send(_str_encode(type, text))
+        # Local reference: the supervisor thread may replace or clear 'connection' at any time.
+        sock = connection
+        if sock is None:
+            # The supervisor is (re)connecting; don't pretend the message was sent.
+            comm.chat_msg.emit("[Client] ", "Not connected to the server, message not sent.")
+            return
+        wire = text
+        if (type == "t" and isinstance(text, str) and e2e_interaction.is_active()
+                and not text.startswith(e2e_interaction.HANDSHAKE_PREFIX)):
+            # End-to-end mode: the whole message is sealed at once, the relay only sees the ciphertext.
+            wire = e2e_interaction.seal(text)
+        if (type == "t" and isinstance(wire, str)
+                and (len(wire) > FRAGMENT_CHARS or wire.startswith(FRAGMENT_PREFIX) or wire.startswith(BENCH_PREFIX))):
+            # Long chat message: sent as a sequence of fragments from a background thread, so that
+            # a large paste doesn't freeze the UI during the upload.
+            threading.Thread(target=_send_fragments_worker, args=(sock, type, wire, text), daemon=True).start()
+            return
+        try:
+            # Encode the message into ISC format and send it over the connection.
+            frame = _str_encode(type, wire)
+            with _send_lock:
+                sock.sendall(frame)
+            recorder.record("frame_out", type, len(wire) if isinstance(wire, str) else len(wire) // 4)
+        except ValueError as e:
+            comm.chat_msg.emit("[Client] ", str(e))
+            return
+        except OSError:
+            # The link died (or the send timed out) while sending: the supervisor reconnects.
+            _abort_connection(sock)
+            comm.chat_msg.emit("[Client] ", "Connection lost, message not sent.")
+            return
 
         text_to_add = ""
         # If the message is a bytearray, filter out any null bytes before decoding.
@@ -251,5 +658,240 @@ def send_message(type, text):
 
         # Emit a signal to update the chat UI with the sent message.
         comm.chat_msg.emit("[You] ", text_to_add)
-        # Store the sent message to avoid echoing it back upon reception.
-        last_own_sent_message = text
+        # Store the sent message (as it went over the wire) to avoid echoing it back upon reception.
+        last_own_sent_message = wire
+
+def _send_fragments_worker(sock, type, wire, text):
+    """
+    Sends a long chat message as a sequence of fragments, each in its own frame.
+
+    The local copy is shown in parts as the fragments go out (through 'comm.chat_msg_part'),
+    so the chat display never has to render the whole text at once.
+
+    :param sock: The socket to send on.
+    :param type: The message type ('t').
+    :param wire: The text as it goes over the wire (sealed in end-to-end mode).
+    :param text: The text typed by the user, shown in the chat.
+    """
+    msg_id, fragments = _fragment(wire)
+    _own_fragment_ids.add(msg_id)
+    # The displayed text is cut in as many parts as there are fragments.
+    part = -(-len(text) // len(fragments))
+    try:
+        for seq, fragment in enumerate(fragments):
+            with _send_lock:
+                sock.sendall(_str_encode(type, fragment))
+            recorder.record("frame_out", type, len(fragment))
+            comm.chat_msg_part.emit("[You] ", msg_id, text[seq * part:(seq + 1) * part], seq == len(fragments) - 1)
+    except OSError:
+        # The link died (or the send timed out) in the middle of the message: the supervisor reconnects.
+        _abort_connection(sock)
+        _own_fragment_ids.discard(msg_id)
+        comm.chat_msg_part.emit("", msg_id, "", True)
+        comm.chat_msg.emit("[Client] ", "Connection lost, the message was only partly sent.")
+
+# ==========================================================
+#               IMAGE SENDING FUNCTIONS
+# ==========================================================
+
+def _sendall_buffers(sock, buffers):
+    """
+    Sends several buffers as one contiguous stream, without joining them first.
+
+    sendmsg() hands all the buffers to the kernel in a single call (scatter-gather), so
+    the pixels go from the NumPy array to the socket without an intermediate copy.
+
+    :param sock: The socket to send on.
+    :param buffers: A list of bytes-like objects (bytes, memoryview, contiguous NumPy arrays).
+    """
+    views = [memoryview(b).cast("B") for b in buffers]
+    if not hasattr(sock, "sendmsg"):
+        # No sendmsg() on this platform (Windows): send the buffers one after the other.
+        for view in views:
+            sock.sendall(view)
+        return
+    while views:
+        sent = sock.sendmsg(views)
+        # Drop the buffers that were sent completely and cut the partially sent one.
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views:
+            views[0] = views[0][sent:]
+
+def _send_image_frame(sock, array):
+    """
+    Sends an RGB image as one ISC image frame.
+
+    :param sock: The socket to send on.
+    :param array: The image as a (height x width x 3) uint8 NumPy array, both sides at most MAX_IMAGE_SIDE.
+    """
+    height, width = array.shape[:2]
+    header = b'ISC' + b'i' + bytes([width, height])
+    # Each row of the array is contiguous even when the array is a tile of a larger image,
+    # so the rows are sent as they are instead of copying the tile.
+    rows = [array] if array.flags.c_contiguous else list(array)
+    with _send_lock:
+        _sendall_buffers(sock, [header] + rows)
+    recorder.record("frame_out", "i", str(width) + "x" + str(height))
+
+def _fit_image(image, max_width, max_height):
+    """
+    Converts an image to RGB and shrinks it to fit the given size, keeping its aspect ratio.
+
+    The resize is done by PIL in C; 'reducing_gap' first reduces large images by an integer
+    factor (a fast box filter) before the final Lanczos resampling.
+
+    :param image: The PIL image.
+    :param max_width: The maximum width in pixels.
+    :param max_height: The maximum height in pixels.
+    :return: The image as a (height x width x 3) uint8 NumPy array.
+    """
+    image = image.convert("RGB")
+    scale = min(max_width / image.width, max_height / image.height, 1)
+    if scale < 1:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return np.asarray(image, dtype=np.uint8)
+
+def _send_image_worker(path, tile):
+    """
+    Loads, resizes and sends an image; runs in its own thread so the UI stays responsive.
+
+    :param path: The path of the image file.
+    :param tile: If True, large images are sent as a grid of up to MAX_IMAGE_TILES x MAX_IMAGE_TILES frames.
+    """
+    try:
+        with Image.open(path) as image:
+            side = MAX_IMAGE_SIDE * (MAX_IMAGE_TILES if tile else 1)
+            array = _fit_image(image, side, side)
+    except OSError as e:
+        comm.chat_msg.emit("[Client] ", "Couldn't load the image: " + str(e))
+        return
+
+    # Local reference: the supervisor thread may replace or clear 'connection' at any time.
+    sock = connection
+    if sock is None:
+        comm.chat_msg.emit("[Client] ", "Not connected to the server, image not sent.")
+        return
+
+    height, width = array.shape[:2]
+    frames = 0
+    try:
+        # Tiles are views of the array, row by row and left to right.
+        for y in range(0, height, MAX_IMAGE_SIDE):
+            for x in range(0, width, MAX_IMAGE_SIDE):
+                _send_image_frame(sock, array[y:y + MAX_IMAGE_SIDE, x:x + MAX_IMAGE_SIDE])
+                frames += 1
+    except OSError:
+        _abort_connection(sock)
+        comm.chat_msg.emit("[Client] ", "Connection lost, image not sent.")
+        return
+    comm.chat_msg.emit("[You] ", "Image sent: " + path + " (" + str(width) + "x" + str(height) + ", " + str(frames) + " frame(s))")
+
+def send_image(path, tile=False):
+    """
+    Sends an image file to the server as ISC image frames, in a background thread.
+
+    :param path: The path of the image file.
+    :param tile: If True, large images are split into several frames instead of being shrunk to one.
+    """
+    threading.Thread(target=_send_image_worker, args=(path, tile), daemon=True).start()
+
+# ==========================================================
+#               ROUND-TRIP LATENCY BENCHMARK
+# ==========================================================
+
+def _handle_bench_echo(text):
+    """
+    Matches the echo of a benchmark ping with the time it was sent.
+
+    Pings of other clients (or of a finished run) aren't in the table and are dropped.
+
+    :param text: The decoded message (starting with BENCH_PREFIX).
+    """
+    with _bench_lock:
+        sent = _bench_pending.pop(text, None)
+    if sent is not None:
+        _bench_rtts.append(time.perf_counter() - sent)
+        _bench_slots.release()
+
+def _bench_worker(count, type):
+    """
+    Sends the benchmark pings, waits for their echoes and reports the statistics in the chat.
+
+    Up to BENCH_WINDOW pings are in flight at once, so the rate measures what the link and the
+    server can take rather than a single round trip at a time.
+
+    :param count: The number of pings to send.
+    :param type: The frame type of the pings ('t' or 's').
+    """
+    global _bench_rtts, _bench_slots, _bench_running
+    # Local reference: the supervisor thread may replace or clear 'connection' at any time.
+    sock = connection
+    if sock is None:
+        comm.chat_msg.emit("[Bench] ", "Not connected to the server, benchmark not started.")
+        _bench_running = False
+        return
+
+    run_id = format(random.getrandbits(32), "08x")
+    rtts = list()
+    slots = threading.Semaphore(BENCH_WINDOW)
+    with _bench_lock:
+        _bench_pending.clear()
+        _bench_rtts = rtts
+        _bench_slots = slots
+
+    sent = 0
+    started = time.perf_counter()
+    try:
+        for seq in range(count):
+            if not slots.acquire(timeout=BENCH_TIMEOUT):
+                break    # No echo for a while: the remaining pings would be lost as well.
+            tag = BENCH_PREFIX + run_id + ":" + str(seq)
+            frame = _str_encode(type, tag)
+            # Registered before sending: the echo may come back before sendall() returns.
+            with _bench_lock:
+                _bench_pending[tag] = time.perf_counter()
+            with _send_lock:
+                sock.sendall(frame)
+            recorder.record("frame_out", type, len(tag))
+            sent += 1
+        # Wait for the echoes still in flight.
+        deadline = time.monotonic() + BENCH_TIMEOUT
+        for _ in range(BENCH_WINDOW):
+            slots.acquire(timeout=max(0, deadline - time.monotonic()))
+    except OSError:
+        _abort_connection(sock)
+        comm.chat_msg.emit("[Bench] ", "Connection lost, benchmark stopped.")
+    elapsed = time.perf_counter() - started
+
+    with _bench_lock:
+        lost = len(_bench_pending)
+        _bench_pending.clear()
+    _bench_running = False
+
+    report = str(sent) + " ping(s) sent, " + str(len(rtts)) + " echoed, " + str(lost) + " lost"
+    if rtts:
+        ms = np.array(rtts) * 1000
+        report += ("; RTT min " + "%.2f" % ms.min() + " ms, p50 " + "%.2f" % np.percentile(ms, 50)
+                   + " ms, p99 " + "%.2f" % np.percentile(ms, 99) + " ms, max " + "%.2f" % ms.max()
+                   + " ms; " + "%.0f" % (len(rtts) / elapsed) + " msg/s")
+    comm.chat_msg.emit("[Bench] ", report)
+
+def bench_ping(count, type="t"):
+    """
+    Measures the round-trip time to the server with pings that it echoes back, in a background thread.
+
+    The pings don't go through send_message(): they are neither shown in the chat nor stored in
+    'last_own_sent_message', so the echo suppression of the normal chat keeps working.
+
+    :param count: The number of pings to send.
+    :param type: The frame type of the pings ('t' or 's').
+    """
+    global _bench_running
+    if _bench_running:
+        comm.chat_msg.emit("[Bench] ", "A benchmark is already running.")
+        return
+    _bench_running = True
+    threading.Thread(target=_bench_worker, args=(count, type), daemon=True).start()
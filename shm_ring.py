@@ -0,0 +1,111 @@
+# ==========================================================
+#               IMPORTS AND GLOBAL DEFINITIONS
+# ==========================================================
+
+import struct                                   # Packs the read position stored in the shared header.
+import time                                     # Used to wait while the ring is full.
+from multiprocessing import shared_memory       # Memory block shared between the network and the GUI processes.
+
+# Size of the header placed before the data area. It holds the consumer's read position
+# (8 bytes) and is padded so that the data starts on a cache line.
+_HEADER_SIZE = 64
+
+# ==========================================================
+#                  SHARED MEMORY RING BUFFER
+# ==========================================================
+
+class SharedRing:
+    def __init__(self, capacity, name=None):
+        """
+        Constructor for SharedRing, a single-producer / single-consumer byte ring in shared memory.
+
+        Positions are absolute byte counts (never wrapped); the offset in the ring is the
+        position modulo the capacity. The producer keeps its write position for itself and
+        tells the consumer where each record starts through a pipe; the consumer publishes
+        its read position in the header so that the producer knows which space is free.
+        Records never wrap around the end of the ring: the tail is skipped instead.
+
+        :param capacity: The size of the data area in bytes.
+        :param name: The name of an existing block to attach to; None creates a new block.
+        """
+        self.capacity = capacity
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=_HEADER_SIZE + capacity)
+        self.data = self.shm.buf[_HEADER_SIZE:_HEADER_SIZE + capacity]
+        self.write_pos = 0
+        if self.owner:
+            struct.pack_into("<Q", self.shm.buf, 0, 0)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def read_pos(self):
+        """
+        :return: The position up to which the consumer has released the data.
+        """
+        return struct.unpack_from("<Q", self.shm.buf, 0)[0]
+
+    def fits(self, length):
+        """
+        A record that doesn't fit before the end of the ring waits for the skipped tail to be
+        released, which only happens once the consumer has read everything written before.
+        Records up to half the capacity always fit in the space freed that way; bigger ones
+        could wait forever.
+
+        :param length: The size of a record in bytes.
+        :return: True if a record of this size can always be stored in the ring.
+        """
+        return length <= self.capacity // 2
+
+    def write(self, data, timeout=None):
+        """
+        Copies a record into the ring, waiting for the consumer to free enough space.
+
+        :param data: A bytes-like object (bytes, bytearray, memoryview or contiguous NumPy array).
+        :param timeout: (Optional) Maximum number of seconds to wait for free space.
+        :return: The absolute start position of the record, or None on timeout.
+        """
+        view = memoryview(data).cast("B")
+        length = len(view)
+        start = self.write_pos
+        # Skip the tail of the ring if the record would cross its end.
+        if start % self.capacity + length > self.capacity:
+            start += self.capacity - start % self.capacity
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while start + length - self.read_pos() > self.capacity:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(0.001)
+
+        offset = start % self.capacity
+        self.data[offset:offset + length] = view
+        self.write_pos = start + length
+        return start
+
+    def view(self, start, length):
+        """
+        :param start: The absolute start position of a record (as returned by write).
+        :param length: The size of the record.
+        :return: A memoryview of the record, valid until it is released.
+        """
+        offset = start % self.capacity
+        return self.data[offset:offset + length]
+
+    def release(self, end):
+        """
+        Gives the space up to the given position back to the producer.
+
+        :param end: The absolute position just after the last consumed record.
+        """
+        struct.pack_into("<Q", self.shm.buf, 0, end)
+
+    def close(self):
+        """
+        Detaches from the shared memory block and destroys it if this side created it.
+        """
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
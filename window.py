@@ -1,6 +1,7 @@
 import random      # For generating random numbers (used in click_task to add a random number)
 import re          # For working with regular expressions (used to verify task command formats)
 import sys         # Provides access to system-specific parameters and functions (e.g., sys.argv)
+import time        # For timing the updates of the message display (flight recorder)
 
 # Import PySide6 modules for building the GUI application:
 from PySide6.QtWidgets import (
@@ -16,17 +17,26 @@ from PySide6.QtWidgets import (
     QSizePolicy,     # Used to control the resizing behavior of widgets
     QLabel           # Widget to display text or images
 )
-from PySide6.QtGui import QIcon   # For handling icons in the application
-from PySide6.QtCore import Qt      # Contains various identifiers used for widget behavior and event handling
+from PySide6.QtGui import QIcon, QImage, QKeySequence, QTextCursor, QTextDocument   # For icons, images, shortcuts and the content of the message display
+from PySide6.QtCore import Qt, QUrl      # Contains various identifiers used for widget behavior and event handling
 
 # Import custom modules for cryptographic and server interaction
 import crypto_interaction    # Handles encoding/cryptography-related tasks
 import server_interaction    # Handles the communication with a server
+import network_process       # Runs the networking in a separate process (multi-process mode)
+import e2e_interaction       # Seals the chat messages end-to-end between clients
+import recorder              # Flight recorder (UI flush timings, '/trace dump')
+import image_archive         # Archive of the received images, read through mmap
 from communicator import comm  # Provides communication signals (e.g., for chat messages)
 
 # Global variables:
 _window = None   # Holds the main window instance (used for global access to the window)
 _max = 20        # Maximum value used for generating random numbers for tasks
+_max_input = 2 ** 31 - 1   # Maximum length of the message input (long texts are sent in fragments)
+
+# Images received in multi-process mode, as QImage by image counter.
+# They are handed to the text document directly, so they don't have to be read back from the archive.
+image_cache = dict()
 
 # -----------------------------------------------------------------------------
 # Custom QPushButton subclass that toggles its mode on right-click events
@@ -59,6 +69,40 @@ class ToggleButton(QPushButton):
             # For any click other than right-click, perform the default behavior (emitting clicked signal)
             super().mousePressEvent(event)
 
+# -----------------------------------------------------------------------------
+# Custom QLineEdit subclass that sends multi-line pastes as they are
+# -----------------------------------------------------------------------------
+class MessageInput(QLineEdit):
+    def __init__(self, on_multiline_paste, parent=None):
+        """
+        Constructor for MessageInput.
+
+        A QLineEdit drops the line breaks of pasted text, so a pasted log would lose its lines:
+        such pastes are handed to the callback instead of being inserted.
+
+        :param on_multiline_paste: Called with the full text (current input + clipboard) of a multi-line paste.
+        :param parent: Optional parent widget.
+        """
+        super().__init__(parent)
+        self.on_multiline_paste = on_multiline_paste
+        self.setMaxLength(_max_input)  # The default limit (32767) would cut long pastes
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Paste):
+            pasted = QApplication.clipboard().text()
+            if "\n" in pasted:
+                self.on_multiline_paste(self.text() + pasted)
+                self.setText("")
+                return
+        # Any other key (or a single-line paste) keeps the default behavior
+        super().keyPressEvent(event)
+
+# -----------------------------------------------------------------------------
+# Name of the document resource holding an image (the pixels never go through a file).
+# -----------------------------------------------------------------------------
+def image_url(incr):
+    return QUrl("archive:img" + str(incr))
+
 # -----------------------------------------------------------------------------
 # A helper function to retrieve the global main window instance.
 # -----------------------------------------------------------------------------
@@ -75,6 +119,7 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("ISC - Internet Secured Chat")
         self.setWindowIcon(QIcon("ISC-logo.png"))
         self.setFixedSize(1280, 720)  # Fix the size of the main window
+        self.setAcceptDrops(True)     # Image files dropped on the window are sent to the chat
 
         # -------------------------------------------------------------------------
         # Set up the main container and layout.
@@ -101,7 +146,8 @@ class MainWindow(QMainWindow):
 
         # Input area for sending messages/commands:
         input_layout = QHBoxLayout()
-        self.message_input = QLineEdit()
+        # Multi-line pastes (e.g. logs) are sent right away, line breaks included
+        self.message_input = MessageInput(self.submit_input)
         self.message_input.setPlaceholderText("Enter message or command...")
         # Connect pressing return to sending a message
         self.message_input.returnPressed.connect(self.send_message)
@@ -141,10 +187,10 @@ class MainWindow(QMainWindow):
         btn_vigenere.clicked.connect(lambda: self.click_task(btn_vigenere.text().lower()))
         command_layout.addWidget(btn_vigenere)
         
-        # Create an RSA button (no toggle on right-click for RSA)
+        # Create an RSA button with toggling capability (the "RSA" label keeps its case for the task command)
         btn_rsa = ToggleButton("RSA encode", encode_toggle)
         btn_rsa.setFixedSize(150, 30)
-        btn_rsa.clicked.connect(lambda: self.click_task("RSA encode"))
+        btn_rsa.clicked.connect(lambda: self.click_task(btn_rsa.text()))
         command_layout.addWidget(btn_rsa)
 
         # Create a Hash button with toggling between hash and verify
@@ -165,7 +211,13 @@ class MainWindow(QMainWindow):
 
         # Connect communication signals (for handling incoming chat messages or images)
         comm.chat_msg.connect(self.add_message)
+        comm.chat_msg_part.connect(self.add_message_part)
+        # Insertion cursors of the long messages being received, by message id
+        self.message_parts = dict()
         comm.chat_img.connect(self.add_image)
+        comm.chat_img_rows.connect(self.add_image_rows)
+        # Pixels (RGB bytes) of the images being received, by image counter
+        self.image_progress = dict()
 
         # Add the two main containers to the overall horizontal layout
         main_layout.addWidget(message_panel)
@@ -220,56 +272,37 @@ class MainWindow(QMainWindow):
         """
         Sends the user input message to the server when 'Enter' is pressed.
         """
-        
-        # Get the default mode from the server interaction module.
-        type = server_interaction.mode
-
-        # Use regex to detect specific task commands (shift, vigenere, RSA tasks; hash tasks; Diffie-Hellman)
-        if re.search("task ((shift|vigenere|RSA) (encode|decode) ([1-9][0-9]{0,3}|10000)|hash (hash|verify)|DifHel)", self.message_input.text()) != None:
-            type = "s"  # Override to 's' mode for tasks
-            # Set various flags in crypto_interaction based on the task keywords in the message
-            if self.message_input.text().__contains__("shift"):
-                crypto_interaction.isShifting = True
-                crypto_interaction.server_msg.clear()
-            elif self.message_input.text().__contains__("vigenere"):
-                crypto_interaction.isVigenering = True
-                crypto_interaction.server_msg.clear()
-            elif self.message_input.text().__contains__("RSA"):
-                crypto_interaction.isRSAing = True
-                crypto_interaction.server_msg.clear()
-            
-            if self.message_input.text().__contains__("encode"):
-                crypto_interaction.isEncoding = True
-                crypto_interaction.server_msg.clear()
-
-            if self.message_input.text().__contains__("hash"):
-                crypto_interaction.isHashing = True
-                crypto_interaction.server_msg.clear()
-
-            if self.message_input.text().__contains__("verify"):
-                crypto_interaction.isVerifying = True
-                crypto_interaction.server_msg.clear()
-
-            if self.message_input.text().__contains__("DifHel"):
-                crypto_interaction.difHelStep = 1
-                crypto_interaction.isDifHeling = True
-                crypto_interaction.server_msg.clear()
-
-        # If message starts with '/s ', remove the prefix and set type to 's'
-        if self.message_input.text().startswith("/s "):
-            type = "s"
-            self.message_input.setText(self.message_input.text()[3:])
-
-        # If message starts with '/crypto', pass the arguments to the crypto_interaction module
-        if self.message_input.text().startswith("/crypto"):
-            crypto_interaction.crypto(self.message_input.text().split(" ")[1:])
-        else: 
-            # Otherwise, send the message using server_interaction module.
-            server_interaction.send_message(type, self.message_input.text())
+        self.submit_input(self.message_input.text())
 
         # Clear the message input field after sending the message.
         self.message_input.setText("")
 
+    # ------------------------------------------------------------------------------
+    # Hands a line of input (typed or generated, e.g. by a drop) to the process owning the socket.
+    # ------------------------------------------------------------------------------
+    def submit_input(self, text):
+        # In multi-process mode, the network process owns the socket and the crypto tasks.
+        if network_process.is_running():
+            if text.startswith("/trace"):
+                # Each process has its own recorder: the UI events are dumped here, the network ones over there.
+                dump_trace()
+            network_process.send_input(text)
+        else:
+            process_input(text)
+
+    # ------------------------------------------------------------------------------
+    # Drag-and-drop: accept local files and send each of them as an image.
+    # ------------------------------------------------------------------------------
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        for url in event.mimeData().urls():
+            if url.isLocalFile():
+                self.submit_input("/img " + url.toLocalFile())
+        event.acceptProposedAction()
+
     # ------------------------------------------------------------------------------
     # Appends a new message to the chat display area.
     # Also adds a title to identify the sender.
@@ -281,11 +314,43 @@ class MainWindow(QMainWindow):
         :param who: The sender of the message.
         :param text: The content of the message.
         """
+        started = time.perf_counter()
         self.add_title(who)  # Add the sender's title
         # Append the new message with HTML formatting (using paragraph tags)
         self.message_display.append("<p style=\"margin:0px;\">" + text + "</p>")
+        recorder.record("ui_flush", "message", len(text), "%.0fus" % ((time.perf_counter() - started) * 1e6))
         return
     
+    # ------------------------------------------------------------------------------
+    # Appends the next part of a long message, received in several fragments.
+    # ------------------------------------------------------------------------------
+    def add_message_part(self, who, msg_id, text, last):
+        """
+        Inserts a part of a long message at the end of that message, even if other messages arrived since.
+
+        :param who: The sender of the message.
+        :param msg_id: The id of the fragmented message.
+        :param text: The text of the part (inserted as plain text).
+        :param last: True for the last part (or when the message is dropped).
+        """
+        started = time.perf_counter()
+        cursor = self.message_parts.get(msg_id)
+        if cursor is None:
+            if last and not text:
+                return
+            # First part: title and an empty paragraph, with a cursor kept at its end.
+            self.add_title(who)
+            self.message_display.append("<p style=\"margin:0px;\"></p>")
+            cursor = QTextCursor(self.message_display.document().lastBlock())
+            cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock)
+            self.message_parts[msg_id] = cursor
+        # The cursor moves along with the inserted text and stays in this message.
+        cursor.insertText(text)
+        if last:
+            del self.message_parts[msg_id]
+        recorder.record("ui_flush", "part", len(text), "%.0fus" % ((time.perf_counter() - started) * 1e6))
+        return
+
     # ------------------------------------------------------------------------------
     # Adds a title (i.e., the sender's identity) above the message.
     # ------------------------------------------------------------------------------
@@ -298,16 +363,203 @@ class MainWindow(QMainWindow):
     # It calls add_title to note that an image is being added.
     # ------------------------------------------------------------------------------
     def add_image(self, incr):
-        self.add_title("[Image]")
-        # Append an HTML image element with the specified source and styling
-        self.message_display.append("<img src=\"imgs/img" + str(incr) + ".png\" alt=\"Image\" style=\"margin:0px;margin-bottom:10px;\"></img>")
+        started = time.perf_counter()
+        # The placeholder of an image shown while it was received already holds every row.
+        placeholder = self.image_progress.pop(incr, None) is not None
+        # Use the raw pixels already received from the network process when there are some.
+        image = image_cache.pop(incr, None)
+        if image is None and not placeholder:
+            # Otherwise (e.g. '/archive show'), copy the pixels straight from the mapped archive.
+            try:
+                array = image_archive.read(incr)
+            except OSError as e:
+                print("[Window] The image couldn't be read from the archive.")
+                print(e)
+                array = None
+            if array is not None:
+                image = QImage(array.data, array.shape[1], array.shape[0], array.shape[1] * 3, QImage.Format.Format_RGB888).copy()
+        if image is not None:
+            self.message_display.document().addResource(QTextDocument.ResourceType.ImageResource, image_url(incr), image)
+        if not placeholder:
+            self.add_title("[Image]")
+            # Append an HTML image element with the specified source and styling
+            self.message_display.append("<img src=\"" + image_url(incr).toString() + "\" alt=\"Image\" style=\"margin:0px;margin-bottom:10px;\"></img>")
+        recorder.record("ui_flush", "image", incr, "%.0fus" % ((time.perf_counter() - started) * 1e6))
+        return
+
+    # ------------------------------------------------------------------------------
+    # Shows the rows of an image while it is being received.
+    # The first rows add a gray placeholder of the final size, later rows update it in place.
+    # ------------------------------------------------------------------------------
+    def add_image_rows(self, incr, width, height, first_row, pixels):
+        """
+        Copies newly received rows into the placeholder of an image and redraws it.
+
+        :param incr: The image counter.
+        :param width: The width of the image.
+        :param height: The height of the image.
+        :param first_row: The index of the first row in 'pixels'.
+        :param pixels: The RGB bytes of one or more complete rows.
+        """
+        started = time.perf_counter()
+        name = image_url(incr)
+        buffer = self.image_progress.get(incr)
+        new = buffer is None
+        if new:
+            buffer = bytearray(b"\x80" * (width * height * 3))
+            self.image_progress[incr] = buffer
+        start = first_row * width * 3
+        buffer[start:start + len(pixels)] = pixels
+        # The resource is set before the image element is added, so the document never loads an old file of the same name.
+        self.message_display.document().addResource(QTextDocument.ResourceType.ImageResource, name,
+                                                    QImage(buffer, width, height, width * 3, QImage.Format.Format_RGB888).copy())
+        if new:
+            self.add_title("[Image]")
+            self.message_display.append("<img src=\"" + name.toString() + "\" alt=\"Image\" style=\"margin:0px;margin-bottom:10px;\"></img>")
+        else:
+            # Replacing the resource and repainting updates the image already in the transcript.
+            self.message_display.viewport().update()
+        recorder.record("ui_flush", "image_rows", incr, first_row, "%.0fus" % ((time.perf_counter() - started) * 1e6))
         return
 
+# ------------------------------------------------------------------------------
+# Handles a line entered in the message input.
+# Kept outside of MainWindow so that the network process can run it in multi-process mode.
+# ------------------------------------------------------------------------------
+def process_input(text):
+    """
+    Processes a line entered by the user: sets the crypto task flags, runs the /crypto
+    commands and sends the message to the server.
+
+    :param text: The text of the message input.
+    """
+    # Get the default mode from the server interaction module.
+    type = server_interaction.mode
+
+    # Use regex to detect specific task commands (shift, vigenere, RSA tasks; hash tasks; Diffie-Hellman)
+    if re.search("task ((shift|vigenere|RSA) (encode|decode) ([1-9][0-9]{0,3}|10000)|hash (hash|verify)|DifHel)", text) != None:
+        type = "s"  # Override to 's' mode for tasks
+        # Set various flags in crypto_interaction based on the task keywords in the message
+        if text.__contains__("shift"):
+            crypto_interaction.isShifting = True
+            crypto_interaction.server_msg.clear()
+        elif text.__contains__("vigenere"):
+            crypto_interaction.isVigenering = True
+            crypto_interaction.server_msg.clear()
+        elif text.__contains__("RSA"):
+            crypto_interaction.isRSAing = True
+            crypto_interaction.server_msg.clear()
+        
+        if text.__contains__("encode"):
+            crypto_interaction.isEncoding = True
+            crypto_interaction.server_msg.clear()
+
+        if text.__contains__("hash"):
+            crypto_interaction.isHashing = True
+            crypto_interaction.server_msg.clear()
+
+        if text.__contains__("verify"):
+            crypto_interaction.isVerifying = True
+            crypto_interaction.server_msg.clear()
+
+        if text.__contains__("DifHel"):
+            crypto_interaction.difHelStep = 1
+            crypto_interaction.isDifHeling = True
+            crypto_interaction.server_msg.clear()
+
+        recorder.record("task", "start", crypto_interaction.task_state())
+
+    # If message starts with '/s ', remove the prefix and set type to 's'
+    if text.startswith("/s "):
+        type = "s"
+        text = text[3:]
+
+    # If message starts with '/crypto', pass the arguments to the crypto_interaction module
+    if text.startswith("/crypto"):
+        crypto_interaction.crypto(text.split(" ")[1:])
+    # '/e2e start' offers a session (sends our Diffie-Hellman public key), '/e2e accept' answers
+    # the offer of a peer, '/e2e stop' goes back to plaintext chat
+    elif text.startswith("/e2e"):
+        if text.split(" ")[-1] == "stop":
+            e2e_interaction.stop()
+            comm.chat_msg.emit("[E2E] ", "Session closed, messages are sent in plaintext")
+        elif text.split(" ")[-1] == "accept":
+            reply, status = e2e_interaction.accept()
+            server_interaction.report_handshake(reply, status)
+            if status is None:
+                comm.chat_msg.emit("[E2E] ", "A session is already established." if e2e_interaction.is_active()
+                                   else "The next session offered by a peer will be accepted.")
+        else:
+            server_interaction.send_message("t", e2e_interaction.start())
+    # '/img <path>' sends an image (shrunk to one frame), '/img tile <path>' splits large images into several frames
+    elif text.startswith("/img "):
+        path = text[5:]
+        tile = path.startswith("tile ")
+        server_interaction.send_image(path[5:] if tile else path, tile)
+    # '/trace dump' writes the last events of the flight recorder to a file
+    elif text.startswith("/trace"):
+        dump_trace()
+    # '/bench ping N [s]' measures the round-trip time with N pings echoed by the server ('t' frames by default)
+    elif text.startswith("/bench"):
+        command = text.split(" ")[1:]
+        if len(command) >= 2 and command[0] == "ping" and command[1].isdigit() and 0 < int(command[1]) <= 100000:
+            server_interaction.bench_ping(int(command[1]), "s" if command[-1] == "s" else "t")
+        else:
+            comm.chat_msg.emit("[Bench] ", "Usage: /bench ping <1-100000> [s]")
+    # '/archive list|show <id>|export <id> <path>|compact' browses and maintains the image archive
+    elif text.startswith("/archive"):
+        archive_command(text.split(" ")[1:])
+    else: 
+        # Otherwise, send the message using server_interaction module.
+        server_interaction.send_message(type, text)
+
+# ------------------------------------------------------------------------------
+# Handles the '/archive' commands.
+# ------------------------------------------------------------------------------
+def archive_command(command):
+    """
+    Browses and maintains the image archive.
+
+    :param command: List of string tokens after '/archive' (e.g. ["export", "12", "out.png"]).
+    """
+    action = command[0] if command else "list"
+    try:
+        match action:
+            case "list":
+                ids = image_archive.ids()
+                comm.chat_msg.emit("[Archive] ", str(len(ids)) + " image(s)" + (", ids " + str(ids[0]) + " to " + str(ids[-1]) if ids else ""))
+            case "show" if len(command) == 2 and command[1].isdigit():
+                if image_archive.read(int(command[1])) is None:
+                    comm.chat_msg.emit("[Archive] ", "No such image.")
+                else:
+                    # The image is displayed again from the archive, without decoding any file.
+                    comm.chat_img.emit(int(command[1]))
+            case "export" if len(command) >= 3 and command[1].isdigit():
+                path = " ".join(command[2:])
+                exported = image_archive.export(int(command[1]), path)
+                comm.chat_msg.emit("[Archive] ", ("Image exported to " + path) if exported else "No such image.")
+            case "compact":
+                image_archive.compact()
+                comm.chat_msg.emit("[Archive] ", "Archive compacted.")
+            case _:
+                comm.chat_msg.emit("[Archive] ", "Usage: /archive list | show <id> | export <id> <path> | compact")
+    except (OSError, ValueError) as e:
+        comm.chat_msg.emit("[Archive] ", "Archive error: " + str(e))
+
+# ------------------------------------------------------------------------------
+# Writes the flight recorder of this process to a file and tells where in the chat.
+# ------------------------------------------------------------------------------
+def dump_trace():
+    path = recorder.dump()
+    comm.chat_msg.emit("[Client] ", "Trace written to " + path if path is not None else "The trace couldn't be written.")
+
 # ------------------------------------------------------------------------------
 # Initializes the application window and starts the event loop.
 # ------------------------------------------------------------------------------
 def load_window():
     app = QApplication(sys.argv)  # Create the application object with command-line arguments
+    app.aboutToQuit.connect(server_interaction.stop_connection)  # Close the connection when the window closes
+    app.aboutToQuit.connect(network_process.stop)                # Stop the network process (multi-process mode)
     global _window
     _window = MainWindow()        # Instantiate the main window
     _window.show()                # Display the main window